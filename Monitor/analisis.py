@@ -0,0 +1,434 @@
+# analisis.py - Recepción y decodificación del monitor, en la GUI o en procesos aparte
+#
+# Ingesta es el servidor TCP del monitor sin Qt: acepta conexiones, separa los TX
+# por el sobre v2 y escribe los símbolos de cada uno en su anillo. La usa el
+# ServerThread del monitor (todo en el proceso de la GUI) y también el proceso de
+# ingesta de Analizador.
+#
+# Con Analizador (PROCESOS_ANALISIS > 0 en el monitor) nada de eso corre en la GUI:
+#   - un proceso de ingesta con la Ingesta, que escribe los símbolos de cada TX en un
+#     bloque de memoria compartida (BloqueTX: anillo + resultados),
+#   - N procesos de decodificación; cada TX nuevo se asigna a uno por turno (con
+#     tantos procesos como TX, uno por TX). Cada uno sincroniza, decodifica los 64
+#     bins, reconstruye la señal y cuenta el histograma, y lo publica en el bloque.
+# La GUI solo mapea los bloques y grafica: lee el anillo con su propio cursor, igual
+# que antes, y la última trama decodificada con LectorTX, que se usa como un
+# SincronizadorTramas.
+#
+# Los resultados tienen dos copias: el decodificador escribe en la que no se está
+# mostrando y recién después incrementa el contador de tramas, que dice cuál leer.
+# La GUI lee como un seqlock: contador, copia, contador otra vez; si mientras copiaba
+# se publicó otra trama, el decodificador ya pudo estar escribiendo la copia leída
+# (la trama siguiente a esa usa la misma) y se reintenta.
+
+import multiprocessing as mp
+import queue
+import socket
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pam4 import codec, metricas, sobre  # el monitor agrega la raíz del repo al sys.path
+from pam4.anillo import AnilloSimbolos
+from pam4.reconstruccion import FS, Reconstructor
+from pam4.sincronismo import CABECERA_HOLA, SincronizadorTramas
+
+VENTANA = 0.020  # s de señal reconstruida (el zoom de la pestaña)
+N_SENAL = int(FS * VENTANA)
+ESPERA = 0.1     # s máximos que un decodificador duerme sin datos nuevos
+REINTENTOS = 8   # lecturas de la GUI que se reintentan antes de dejarlo para el próximo cuadro
+
+RESULTADO = np.dtype([
+    ("escrito", "i8"),            # cursor del anillo (lo escribe la ingesta)
+    ("tramas", "i8"),             # tramas decodificadas; tramas % 2 = copia vigente
+    ("bloqueado", "i8"),          # 1 si el sincronizador está enganchado
+    ("hist", "i8", (8,)),         # símbolos recibidos de cada valor
+    ("pos", "i8", (2,)),          # posición de la última cabecera
+    ("bins", "u1", (2, codec.BINS_POR_TRAMA)),
+    ("senal", "f8", (2, N_SENAL)),
+], align=True)
+
+tramas_entrada = metricas.contador("monitor_tramas_entrada_total", "Tramas recibidas en sobres v2")
+bytes_entrada = metricas.contador("monitor_bytes_entrada_total", "Bytes recibidos")
+conexiones = metricas.contador("monitor_conexiones_total", "Conexiones aceptadas")
+demux_us = metricas.histograma("monitor_demux_us", "Tiempo de demux + decodificación por lote (µs)")
+latencia_us = metricas.histograma("monitor_latencia_us", "Desde el timestamp del sobre hasta el demux (µs)")
+
+
+def _nada(*args):
+    pass
+
+
+class Ingesta:
+    """Cada conexión puede traer sobres v2 (pam4/sobre.py: stream, seq, timestamp, CRC) o
+    tramas crudas de 68 bytes (canal con --sin-sobre). Con sobre, cada stream es un TX distinto
+    aunque todos lleguen por la misma conexión; sin sobre, la conexión entera es un TX.
+
+    Avisa por funciones: avisar(texto), nuevo(tx, origen) la primera vez que aparece un TX
+    y datos(tx, ip, simbolos, n) después de escribir en su anillo. anillo(tx) crea el
+    anillo de un TX nuevo (por defecto un AnilloSimbolos en memoria del proceso)."""
+
+    def __init__(self, port=8100, capacidad=10000, avisar=_nada, nuevo=_nada, datos=_nada, anillo=None):
+        self.port = int(port)
+        self.capacidad = capacidad
+        self.avisar, self.nuevo, self.datos = avisar, nuevo, datos
+        self.crear_anillo = anillo or (lambda tx: AnilloSimbolos(self.capacidad))
+        self._stop_event = threading.Event()
+        self.sock = None
+        self.lock = threading.Lock()
+        self.active_clients = []
+        self.clients_lock = threading.Lock()
+        self.rings = {}
+        self.seq = {}        # tx -> próximo seq esperado
+        self.perdidas = {}   # tx -> tramas perdidas (huecos de seq)
+        self.crc_malos = {}  # tx -> tramas con CRC inválido (se muestran igual: son los errores del canal)
+        metricas.medidor("monitor_clientes", lambda: len(self.active_clients), "Conexiones abiertas")
+        metricas.medidor("monitor_crc_malos_total", lambda: dict(self.crc_malos), "Tramas con CRC inválido",
+                         etiqueta="tx", tipo="counter")
+        metricas.medidor("monitor_perdidas_total", lambda: dict(self.perdidas), "Tramas perdidas (huecos de seq)",
+                         etiqueta="tx", tipo="counter")
+
+    def ring(self, tx):
+        with self.lock:
+            if tx not in self.rings:
+                self.rings[tx] = self.crear_anillo(tx)
+            return self.rings[tx]
+
+    def stream(self, tx, origen):
+        """Anillo del TX; avisa la primera vez que aparece."""
+        with self.lock:
+            nuevo = tx not in self.rings
+            if nuevo:
+                self.rings[tx] = self.crear_anillo(tx)
+                self.perdidas[tx] = 0
+                self.crc_malos[tx] = 0
+            ring = self.rings[tx]
+        if nuevo:
+            self.nuevo(tx, origen)
+        return ring
+
+    def stop(self):
+        self._stop_event.set()
+        try:
+            if self.sock:
+                self.sock.close()
+        except OSError:
+            pass
+        with self.clients_lock:
+            for conn in self.active_clients:
+                try:
+                    conn.close()
+                except OSError:
+                    pass
+
+    def run(self):
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(("0.0.0.0", self.port))
+            self.sock.listen(8)
+            self.sock.settimeout(1.0)
+            self.avisar(f"Escuchando en {self.port}")
+        except Exception as e:
+            self.avisar(f"Error inicio: {e}")
+            return
+        while not self._stop_event.is_set():
+            try:
+                conn, addr = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with self.clients_lock:
+                self.active_clients.append(conn)
+            conexiones.sumar()
+            threading.Thread(target=self.client_handler, args=(conn, addr[0]), daemon=True).start()
+
+    def client_handler(self, conn, ip):
+        self.avisar(f"Conectado {ip}")
+        conn.settimeout(2.0)
+        pend, enm = bytearray(), None  # pend: primeros bytes, hasta saber si vienen sobres
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    data = conn.recv(4096)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                if not data:
+                    break
+                bytes_entrada.sumar(len(data))
+                if enm is None:
+                    pend += data
+                    if len(pend) < 3:
+                        continue
+                    if not sobre.es_sobre(pend):
+                        enm = False
+                        self.avisar(f"{ip}: tramas sin sobre (modo 68 bytes)")
+                    else:
+                        enm = sobre.LectorSobres()
+                    data, pend = bytes(pend), None
+                if enm is False:
+                    self.push(ip, ip, codec.bytes_a_simbolos(data))
+                    continue
+                for s, ok in enm.alimentar(data):
+                    self.demux(s, ok, ip)
+        finally:
+            if enm and enm.bytes_descartados:
+                self.avisar(f"{ip}: {enm.bytes_descartados} bytes sin sobre válido descartados")
+            with self.clients_lock:
+                if conn in self.active_clients:
+                    self.active_clients.remove(conn)
+            try:
+                conn.close()
+            except OSError:
+                pass
+            self.avisar(f"Desconectado {ip}")
+
+    def demux(self, s, ok, ip):
+        """Un lote de sobres -> símbolos al anillo de cada stream."""
+        tramas_entrada.sumar(len(s))
+        latencia_us.registrar_lote(sobre.timestamp_us() - s["timestamp"].astype(np.int64))
+        with demux_us.medir():
+            self._demux(s, ok, ip)
+
+    def _demux(self, s, ok, ip):
+        f = s["stream"]
+        fuentes = np.unique(f)
+        for fu in fuentes:
+            m = None if fuentes.size == 1 else f == fu  # lo normal: todo el lote es de un solo stream
+            sel = s if m is None else s[m]
+            malos = int((~ok).sum() if m is None else (~ok[m]).sum())
+            tx = f"{ip}/{fu}"
+            seqs = sel["seq"].astype(np.int64)
+            prev = np.empty_like(seqs)
+            prev[1:] = seqs[:-1] + 1
+            prev[0] = self.seq.get(tx, seqs[0])
+            hue = (seqs - prev) % sobre.SEQ_MOD
+            lost = int(hue[hue < sobre.SEQ_MOD // 2].sum())  # saltos "hacia atrás" = reordenamiento, no pérdida
+            self.seq[tx] = int(seqs[-1] + 1) % sobre.SEQ_MOD
+            self.push(tx, f"TX{fu} @{ip}", codec.bytes_a_simbolos(sel["payload"]), ip)
+            if malos:
+                self.crc_malos[tx] += malos
+                self.avisar(f"TX{fu} @{ip}: {malos} tramas con CRC inválido (total {self.crc_malos[tx]})")
+            if lost:
+                self.perdidas[tx] += lost
+                self.avisar(f"TX{fu} @{ip}: {lost} tramas perdidas (total {self.perdidas[tx]})")
+
+    def push(self, tx, origen, symbols, ip=None):
+        ring = self.stream(tx, origen)
+        self.datos(tx, ip or origen, symbols, ring.escribir(symbols))
+
+
+# --- Memoria compartida por TX ---
+class AnilloCompartido(AnilloSimbolos):
+    """AnilloSimbolos con los símbolos y el cursor dentro de un BloqueTX."""
+
+    def __init__(self, buf, cursor, capacidad):
+        self.capacidad = int(capacidad)
+        self._buf = buf
+        self._cursor = cursor
+
+    @property
+    def escrito(self):
+        return int(self._cursor[()])
+
+    @escrito.setter
+    def escrito(self, n):
+        self._cursor[()] = n
+
+
+class BloqueTX:
+    """Un segmento de shared_memory por TX: RESULTADO y después el anillo espejado."""
+
+    def __init__(self, capacidad, nombre=None):
+        tam = RESULTADO.itemsize + 2 * capacidad
+        if nombre is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=tam)
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name=nombre, track=False)  # 3.13+: no lo borra al salir
+            except TypeError:
+                self.shm = shared_memory.SharedMemory(name=nombre)
+        self.nombre = self.shm.name
+        self.capacidad = capacidad
+        self.r = np.ndarray((), dtype=RESULTADO, buffer=self.shm.buf)
+        buf = np.ndarray(2 * capacidad, dtype=np.uint8, buffer=self.shm.buf, offset=RESULTADO.itemsize)
+        self.anillo = AnilloCompartido(buf, self.r["escrito"], capacidad)
+        if nombre is None:
+            self.r[()] = 0
+
+    def publicar(self, pos, bins, senal):
+        k = int(self.r["tramas"]) + 1
+        self.r["pos"][k % 2] = pos
+        self.r["bins"][k % 2] = bins
+        self.r["senal"][k % 2] = senal
+        self.r["tramas"] = k  # recién ahora la GUI lee esta copia
+
+    def cerrar(self, borrar=False):
+        self.anillo = self.r = None  # sin vistas vivas, close() no falla
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # alguien todavía tiene una vista: se libera cuando la suelte
+        if borrar:
+            self.shm.unlink()
+
+
+class LectorTX:
+    """Del lado de la GUI: la última trama que publicó el decodificador de un TX, con la
+    misma interfaz que SincronizadorTramas (avanzar, bloqueado, reset)."""
+
+    def __init__(self, bloque):
+        self.b = bloque
+        self.reset()
+
+    def reset(self):
+        self.visto = 0
+        self._senal = None
+
+    @property
+    def bloqueado(self):
+        return bool(self.b.r["bloqueado"])
+
+    def avanzar(self, anillo=None):
+        """[(posición_cabecera, bins[64])] si hay una trama nueva desde la última llamada."""
+        r = self.b.r
+        for _ in range(REINTENTOS):
+            k = int(r["tramas"])
+            if k == self.visto:
+                return []
+            pos, bins, senal = int(r["pos"][k % 2]), r["bins"][k % 2].copy(), r["senal"][k % 2].copy()
+            if int(r["tramas"]) == k:  # con k+1 publicada, k+2 ya puede estar pisando k % 2
+                self.visto, self._senal = k, senal
+                return [(pos, bins)]
+        return []  # el decodificador va demasiado rápido: se intenta en el próximo cuadro
+
+    def senal(self):
+        """Señal de la misma trama que devolvió el último avanzar()."""
+        return self._senal
+
+    def hist(self):
+        return self.b.r["hist"].copy()
+
+
+# --- Procesos ---
+def decodificar(bloque, sync, rec, leido):
+    """Lo nuevo del anillo de un TX -> resultados en su bloque. Devuelve el cursor leído."""
+    nuevos, leido = bloque.anillo.desde(leido)
+    if nuevos.size:
+        bloque.r["hist"] += np.bincount(nuevos, minlength=8)[:8]
+    tramas = sync.avanzar(bloque.anillo)
+    if tramas:
+        pos, bins = tramas[-1]  # solo se muestra la última
+        bloque.publicar(pos, bins, rec.senal(bins))
+    bloque.r["bloqueado"] = sync.bloqueado
+    return leido
+
+
+def _proceso_ingesta(port, capacidad, eventos, colas, avisos, parar, puerto_metricas):
+    bloques, asignado = {}, {}
+
+    def anillo(tx):
+        b = bloques[tx] = BloqueTX(capacidad)
+        return b.anillo
+
+    def nuevo(tx, origen):
+        k = asignado[tx] = len(asignado) % len(colas)  # por turno: con N >= TX, uno por proceso
+        colas[k].put((tx, bloques[tx].nombre))
+        eventos.put(("tx", tx, origen, bloques[tx].nombre))
+
+    def datos(tx, ip, simbolos, n):
+        avisos[asignado[tx]].set()
+
+    ing = Ingesta(port, capacidad, avisar=lambda t: eventos.put(("status", t)), nuevo=nuevo, datos=datos,
+                  anillo=anillo)
+    if puerto_metricas:
+        metricas.servir(puerto_metricas)
+    hilo = threading.Thread(target=ing.run, daemon=True)
+    hilo.start()
+    try:
+        parar.wait()
+    except KeyboardInterrupt:
+        pass
+    ing.stop()
+    hilo.join(3)
+    for b in bloques.values():
+        b.cerrar(borrar=True)
+
+
+def _proceso_decodificador(cola, aviso, parar, cabecera, capacidad):
+    rec = Reconstructor(ventana=VENTANA)
+    txs = {}  # tx -> [bloque, sincronizador, cursor]
+    try:
+        while not parar.is_set():
+            aviso.wait(ESPERA)
+            aviso.clear()  # antes de leer: lo que llegue mientras tanto vuelve a avisar
+            while True:
+                try:
+                    tx, nombre = cola.get_nowait()
+                except queue.Empty:
+                    break
+                txs[tx] = [BloqueTX(capacidad, nombre), SincronizadorTramas(cabecera), 0]
+            for t in txs.values():
+                t[2] = decodificar(t[0], t[1], rec, t[2])
+    except KeyboardInterrupt:
+        pass
+    for t in txs.values():
+        t[0].cerrar()
+
+
+class Analizador:
+    """Arranca la ingesta y `procesos` decodificadores; del lado de la GUI mapea los
+    bloques de cada TX a medida que aparecen (eventos())."""
+
+    def __init__(self, port, procesos=1, cabecera=CABECERA_HOLA, capacidad=10000, puerto_metricas=None):
+        ctx = mp.get_context("spawn")  # sin fork: los hijos no heredan el estado de Qt
+        self.capacidad = capacidad
+        self.eventos_q = ctx.Queue()
+        self.parar = ctx.Event()
+        self.bloques = {}
+        # Se guardan aunque la GUI no los use: Process.start() suelta sus args y, sin otra
+        # referencia, los semáforos se borrarían antes de que los hijos los abran
+        self.colas = [ctx.Queue() for _ in range(max(1, procesos))]
+        self.avisos = [ctx.Event() for _ in self.colas]
+        self.procs = [ctx.Process(target=_proceso_decodificador, daemon=True, name=f"decodificador{i}",
+                                  args=(c, a, self.parar, cabecera, capacidad))
+                      for i, (c, a) in enumerate(zip(self.colas, self.avisos))]
+        self.procs.append(ctx.Process(target=_proceso_ingesta, daemon=True, name="ingesta",
+                                      args=(port, capacidad, self.eventos_q, self.colas, self.avisos,
+                                            self.parar, puerto_metricas)))
+        for p in self.procs:
+            p.start()
+
+    def eventos(self):
+        """Eventos pendientes: ("status", texto) o ("tx", tx, origen) con el bloque ya mapeado."""
+        out = []
+        while True:
+            try:
+                ev = self.eventos_q.get_nowait()
+            except queue.Empty:
+                return out
+            if ev[0] == "tx":
+                _, tx, origen, nombre = ev
+                self.bloques[tx] = BloqueTX(self.capacidad, nombre)
+                ev = ("tx", tx, origen)
+            out.append(ev)
+
+    def ring(self, tx):
+        return self.bloques[tx].anillo
+
+    def lector(self, tx):
+        return LectorTX(self.bloques[tx])
+
+    def detener(self, timeout=3):
+        self.parar.set()
+        for p in self.procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        for b in self.bloques.values():
+            b.cerrar()
+        self.bloques = {}
@@ -1,8 +1,13 @@
-import serial
-import matplotlib.pyplot as plt
+import argparse
+import os
+import sys
 import time
-import socket
-import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pam4 import codec
+from pam4 import captura, metricas, registro, sobre
+from envio import FanOut
+from uart import leer_tramas
 
 # Configuración del puerto serie
 PORT = 'COM3'
@@ -17,122 +22,128 @@ destinos = [
     ("10.0.1.173", 8100)
 ]
 
+# Envío TCP: conexión persistente, cola propia (descarta la más vieja) e hilo por destino
+MAX_COLA = 64
+# Lotes: hasta LOTE tramas o ESPERA_MS desde la primera, en una sola escritura
+LOTE = 1
+ESPERA_MS = 0
+# Protocolo: "v2" = cada trama en un sobre con stream, seq, timestamp y CRC (pam4/sobre.py);
+# "legacy" = los 68 bytes crudos de antes
+PROTOCOLO = "v2"
+STREAM_ID = 0  # 0: el canal asigna uno por conexión
+# Logging (pam4/registro.py): el detalle por trama va en debug
+NIVEL_LOG = "info"
+# Página de métricas en 127.0.0.1 (pam4/metricas.py); 0 = sin página
+METRICAS_PUERTO = 9201
+
+log = registro.obtener("transmisor")
+
 # Modulación PAM4 directa desde bytes
 def mod_pam4_desde_bytes(byte_list):
-    bits = ''.join(f'{b:08b}' for b in byte_list)  # 8 bits por byte
-    symbols = [int(bits[i:i+2], 2) for i in range(0, len(bits), 2)]  # 2 bits por símbolo
-    packed = []
-    print("\nEmpaquetado de símbolos PAM4 en bytes:")
-    for i in range(0, len(symbols), 4):
-        grupo = symbols[i:i+4]
-        byte = (grupo[0] << 6) | (grupo[1] << 4) | (grupo[2] << 2) | grupo[3]
-        packed.append(byte)
-        print(f"Símbolos: {grupo} → Byte: {byte} (bin: {byte:08b})")
+    symbols = codec.bytes_a_simbolos(bytes(byte_list))  # 4 símbolos de 2 bits por byte
+    packed = codec.simbolos_a_bytes(symbols)             # 4 símbolos por byte
+    if log.isEnabledFor(registro.DEBUG):
+        log.debug("Empaquetado de símbolos PAM4 en bytes: %s", list(packed))
     return packed, symbols
 
-# Envío TCP
-def enviar(ip, port, datos):
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((ip, port))
-            s.sendall(bytes(datos))
-            print(f"Enviado {len(datos)} bytes a {ip}:{port}")
-    except Exception as e:
-        print(f"Error al enviar a {ip}:{port} → {e}")
-
-# Reconstrucción de señal compuesta usando IFFT
-def reconstruir_senal(amplitudes, freqs, fs=44100, duracion=0.1):
-    N = int(fs * duracion)
-    espectro = np.zeros(N, dtype=complex)
-    for f, A in zip(freqs, amplitudes):
-        idx = int(f * duracion)
-        if idx < N:
-            espectro[idx] = A + 0j
-    senal = np.fft.ifft(espectro).real
-    t = np.linspace(0, duracion, N, endpoint=False)
-    return t, senal
-
-# Inicializar gráfico
-plt.ion()
-
-# Abrir puerto serie
-with serial.Serial(PORT, BAUDRATE, timeout=1) as ser:
-    try:
-        while True:
-            # Esperar "Inicio"
-            buffer = b""
-            while b"Inicio" not in buffer:
-                buffer += ser.read(1)
-
-            # Leer 64 bytes de datos
-            amplitudes = []
-            while len(amplitudes) < 64:
-                byte = ser.read(1)
-                if byte:
-                    amplitudes.append(ord(byte))
-
-            # Esperar "Fin"
-            buffer = b""
-            while b"Fin" not in buffer:
-                buffer += ser.read(1)
-
-            # Agregar la palabra "hola" al inicio del vector
-            palabra = [ord(c) for c in "hola"]  # [104,111,108,97]
-            amplitudes = palabra + amplitudes  # Ahora son 68 bytes
-
-            # Imprimir vector recibido
-            print("\nVector enviado (68 valores decimales):")
-            print(amplitudes)
-
-            # Modulación PAM4 directa
-            datos, symbols = mod_pam4_desde_bytes(amplitudes)
-
-            # Imprimir cantidad y lista de símbolos PAM4
-            print(f"\nCantidad de símbolos PAM4: {len(symbols)}")
-            #print("Símbolos PAM4:")
-            #print(symbols)
-
-            # Enviar a cada destino
-            for ip, port in destinos:
-                enviar(ip, port, datos)
-
-            # Reconstruir señal compuesta (solo con las 64 amplitudes originales)
-            t, senal = reconstruir_senal(amplitudes[4:], freqs)
-
-            # Zoom de 20 ms
-            zoom_duracion = 0.010
-            N_zoom = int(44100 * zoom_duracion)
-            t_zoom = t[:N_zoom]
-            s_zoom = senal[:N_zoom]
-
-            # Graficar
-            plt.clf()
-
-            # 1. Frecuencias y amplitudes
-            plt.subplot(3, 1, 1)
-            plt.bar(freqs, amplitudes[4:], width=80)
-            plt.title("Magnitudes de Frecuencia recibidas (8 bits)")
-            plt.xlabel("Frecuencia [Hz]")
-            plt.ylabel("Valor (0–255)")
-
-            # 2. Histograma de símbolos PAM4
-            plt.subplot(3, 1, 2)
-            counts = [symbols.count(i) for i in range(4)]
-            plt.bar(range(4), counts, tick_label=["0", "1", "2", "3"])
-            plt.title("Histograma de símbolos PAM4")
-            plt.xlabel("Símbolo")
-            plt.ylabel("Cantidad")
-
-            # 3. Señal reconstruida (Zoom 10 ms)
-            plt.subplot(3, 1, 3)
-            plt.plot(t_zoom, s_zoom)
-            plt.title("Señal reconstruida Simulada con fase 0 (Zoom 10 ms)")
-            plt.xlabel("Tiempo [s]")
-            plt.ylabel("Amplitud")
-
-            plt.tight_layout()
-            plt.pause(0.01)
-            time.sleep(1)
-
-    except KeyboardInterrupt:
-        print("Programa finalizado por el usuario.")
\ No newline at end of file
+def parse_args():
+    ap = argparse.ArgumentParser(description="Transmisor PAM4: UART -> PAM4 -> TCP")
+    ap.add_argument("--port", default=PORT, help="puerto serie (default %(default)s)")
+    ap.add_argument("--baudrate", type=int, default=BAUDRATE)
+    ap.add_argument("--headless", action="store_true",
+                    help="solo captura -> modulación -> envío, sin gráficos")
+    ap.add_argument("--fps", type=float, default=2,
+                    help="tasa de refresco del visualizador (proceso aparte)")
+    ap.add_argument("--lote", type=int, default=LOTE,
+                    help="tramas por escritura TCP (default %(default)s)")
+    ap.add_argument("--espera-ms", type=float, default=ESPERA_MS,
+                    help="espera máxima para completar un lote (default %(default)s)")
+    ap.add_argument("--protocolo", choices=("v2", "legacy"), default=PROTOCOLO,
+                    help="formato de trama en el cable (default %(default)s)")
+    ap.add_argument("--stream-id", type=int, default=STREAM_ID,
+                    help="ID de este transmisor en el protocolo v2 (0 = lo asigna el canal)")
+    ap.add_argument("--log", default=NIVEL_LOG, choices=registro.NIVELES,
+                    help="nivel de log; debug muestra cada trama (default %(default)s)")
+    ap.add_argument("--traza", metavar="ARCHIVO",
+                    help="traza binaria de eventos por trama (pam4/registro.py)")
+    ap.add_argument("--captura", metavar="ARCHIVO",
+                    help="grabar cada trama enviada para reproducirla después (pam4/captura.py)")
+    ap.add_argument("--metricas", type=int, default=METRICAS_PUERTO, metavar="PUERTO",
+                    help="puerto de la página de métricas (0 = sin página, default %(default)s)")
+    return ap.parse_args()
+
+def main():
+    import serial
+
+    args = parse_args()
+    registro.configurar(args.log)
+    traza = registro.TrazaBinaria(args.traza) if args.traza else None
+    grabador = captura.Grabador(args.captura, "transmisor") if args.captura else None
+    resumen = registro.Limitador(log, por_segundo=1)  # estado del envío, a lo sumo 1/s
+    fanout = FanOut(destinos, max_cola=MAX_COLA, lote=args.lote, espera_ms=args.espera_ms)
+    tramas = metricas.contador("transmisor_tramas_total", "Tramas leídas de la UART y encoladas")
+    por_trama = metricas.histograma("transmisor_trama_us", "Modulación + sobre + encolado por trama (µs)")
+    if args.metricas:
+        metricas.servir(args.metricas)
+    vis = None
+    if not args.headless:
+        from visualizador import Visualizador
+        vis = Visualizador(fps=args.fps)
+
+    # Agregar la palabra "hola" al inicio del vector
+    palabra = b"hola"  # [104,111,108,97]
+    seq = 0
+
+    # Abrir puerto serie
+    with serial.Serial(args.port, args.baudrate, timeout=1) as ser:
+        try:
+            # "Inicio" + 64 bytes + "Fin", leídos en bloque (uart.py)
+            for magnitudes in leer_tramas(ser):
+                amplitudes = palabra + magnitudes  # Ahora son 68 bytes
+
+                # Vector recibido (68 valores decimales), solo con --log debug
+                depurar = log.isEnabledFor(registro.DEBUG)
+                if depurar:
+                    log.debug("Vector enviado (68 valores decimales): %s", list(amplitudes))
+
+                # Modulación PAM4 directa
+                t0 = time.perf_counter_ns()
+                datos, symbols = mod_pam4_desde_bytes(amplitudes)
+
+                if depurar:
+                    log.debug("Cantidad de símbolos PAM4: %d", len(symbols))
+
+                # Protocolo v2: sobre con stream, seq, timestamp y CRC-32 del payload
+                if args.protocolo == "v2":
+                    datos = sobre.ensobrar(args.stream_id, seq, datos)
+
+                # Enviar a cada destino (solo encola, no bloquea)
+                fanout.enviar(datos)
+                por_trama.registrar((time.perf_counter_ns() - t0) // 1000)
+                tramas.sumar()
+                if grabador:
+                    grabador.grabar_bytes(datos, args.stream_id, seq)
+                if traza:
+                    traza.registrar(registro.EV_TRAMA_TX, args.stream_id, seq, len(datos))
+                seq = (seq + 1) % sobre.SEQ_MOD
+                if resumen.permitir():
+                    resumen.log(fanout.resumen())
+
+                # Los gráficos corren en otro proceso y toman la trama cuando pueden
+                if vis:
+                    vis.publicar(amplitudes)
+
+        except KeyboardInterrupt:
+            log.info("Programa finalizado por el usuario.")
+        finally:
+            fanout.cerrar()
+            if vis:
+                vis.cerrar()
+            if traza:
+                traza.cerrar()
+            if grabador:
+                grabador.cerrar()
+            registro.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# envio.py - Envío TCP concurrente del transmisor a todos los destinos
+#
+# Cada destino tiene:
+#   - una conexión persistente (reconexión con backoff 1, 2, 4, 8, 10 s),
+#   - su propia cola acotada; si se llena se descarta la trama más vieja,
+#   - su propio hilo de envío.
+# FanOut.enviar() solo encola, así el lazo de captura nunca se bloquea en la red.
+#
+# Lotes opcionales: el hilo junta hasta `lote` tramas o espera `espera_ms` desde la
+# primera, lo que pase antes, y las manda en una sola escritura con sendmsg
+# (scatter-gather, sin concatenar). lote=1 manda cada trama apenas llega.
+#
+# Las estadísticas de cada destino se publican como métricas (pam4/metricas.py),
+# con la etiqueta destino="ip:puerto".
+
+import socket
+import threading
+import time
+from collections import deque
+
+from pam4 import metricas, registro  # el script principal agrega la raíz del repo al sys.path
+
+BACKOFF = [1, 2, 4, 8, 10]
+
+log = registro.obtener("transmisor.envio")
+
+
+def enviar_vector(sock, bufs):
+    """Envía varios buffers en una escritura (sendmsg); reintenta si es parcial."""
+    if not hasattr(sock, "sendmsg"):  # Windows: no hay sendmsg
+        sock.sendall(b"".join(bufs))
+        return
+    bufs = [memoryview(b) for b in bufs]
+    while bufs:
+        n = sock.sendmsg(bufs)
+        while n:
+            if n >= len(bufs[0]):
+                n -= len(bufs.pop(0))
+            else:
+                bufs[0] = bufs[0][n:]
+                n = 0
+
+
+class Destino:
+    def __init__(self, ip, port, max_cola=64, timeout=5, lote=1, espera_ms=0):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.lote = max(1, int(lote))
+        self.espera = espera_ms / 1000.0
+        self.cola = deque(maxlen=max_cola)
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.sock = None
+
+        # Estadísticas: descartados_cola la escribe encolar() (con self.cond tomado, desde
+        # el hilo que encola); las demás, solo el hilo de envío de este destino
+        self.enviados = 0
+        self.descartados_cola = 0
+        self.descartados_envio = 0
+        self.conexiones = 0
+        self.lat_ultima = 0.0
+        self.lat_max = 0.0
+        self._lat_suma = 0.0
+
+        self.hilo = threading.Thread(target=self._run, daemon=True)
+        self.hilo.start()
+
+    def __str__(self):
+        return f"{self.ip}:{self.port}"
+
+    def encolar(self, datos):
+        with self.cond:
+            if len(self.cola) == self.cola.maxlen:
+                self.descartados_cola += 1  # deque(maxlen) descarta la más vieja
+            self.cola.append((time.perf_counter(), datos))
+            self.cond.notify()
+
+    def cerrar(self):
+        # El socket es del hilo de envío: acá solo se lo despierta (shutdown corta un envío
+        # bloqueado sin invalidar el descriptor) y él lo cierra al salir
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify()
+        sock = self.sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.hilo.join(self.timeout + 1)
+
+    def _cerrar_sock(self):
+        # Solo desde el hilo de envío
+        try:
+            if self.sock:
+                self.sock.close()
+        except Exception:
+            pass
+        self.sock = None
+
+    def _conectar(self):
+        intento = 0
+        while not self.stop_event.is_set():
+            try:
+                s = socket.create_connection((self.ip, self.port), timeout=self.timeout)
+                s.settimeout(self.timeout)
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.sock = s
+                self.conexiones += 1
+                log.info("Conectado a %s", self)
+                return True
+            except OSError as e:
+                espera = BACKOFF[min(intento, len(BACKOFF) - 1)]
+                log.warning("Error al conectar a %s → %s (reintento en %ss)", self, e, espera)
+                intento += 1
+                self.stop_event.wait(espera)
+        return False
+
+    def _run(self):
+        try:
+            self._enviar_cola()
+        finally:
+            self._cerrar_sock()
+
+    def _enviar_cola(self):
+        while not self.stop_event.is_set():
+            with self.cond:
+                while not self.cola and not self.stop_event.is_set():
+                    self.cond.wait()
+                if self.stop_event.is_set():
+                    return
+                lote = self._juntar_lote()
+            if self.sock is None and not self._conectar():
+                return
+            try:
+                enviar_vector(self.sock, [datos for _, datos in lote])
+            except OSError as e:
+                if not self.stop_event.is_set():
+                    log.warning("Error al enviar a %s → %s", self, e)
+                self._cerrar_sock()
+                self.descartados_envio += len(lote)
+                continue
+            ahora = time.perf_counter()
+            for t0, _ in lote:
+                lat = ahora - t0
+                self.lat_max = max(self.lat_max, lat)
+                self._lat_suma += lat
+            self.lat_ultima = lat
+            self.enviados += len(lote)
+
+    def _juntar_lote(self):
+        # Se llama con self.cond tomado y la cola no vacía
+        lote = [self.cola.popleft()]
+        limite = lote[0][0] + self.espera
+        while len(lote) < self.lote and not self.stop_event.is_set():
+            if self.cola:
+                lote.append(self.cola.popleft())
+                continue
+            resto = limite - time.perf_counter()
+            if resto <= 0:
+                break
+            self.cond.wait(resto)
+        return lote
+
+    def estadisticas(self):
+        return {
+            "destino": str(self),
+            "conectado": self.sock is not None,
+            "enviados": self.enviados,
+            "descartados": self.descartados_cola + self.descartados_envio,
+            "reconexiones": max(0, self.conexiones - 1),
+            "en_cola": len(self.cola),
+            "lat_ultima_ms": self.lat_ultima * 1e3,
+            "lat_media_ms": (self._lat_suma / self.enviados * 1e3) if self.enviados else 0.0,
+            "lat_max_ms": self.lat_max * 1e3,
+        }
+
+
+class FanOut:
+    def __init__(self, destinos, max_cola=64, lote=1, espera_ms=0):
+        self.destinos = [Destino(ip, port, max_cola, lote=lote, espera_ms=espera_ms)
+                         for ip, port in destinos]
+        self._medidores()
+
+    def _medidores(self):
+        def por_destino(clave):
+            return lambda: {str(d): d.estadisticas()[clave] for d in self.destinos}
+
+        for nombre, clave, ayuda, tipo in (
+            ("cola", "en_cola", "Tramas esperando en la cola", "gauge"),
+            ("conectado", "conectado", "1 si hay conexión abierta", "gauge"),
+            ("enviados_total", "enviados", "Tramas enviadas", "counter"),
+            ("descartados_total", "descartados", "Tramas descartadas (cola llena o error)", "counter"),
+            ("reconexiones_total", "reconexiones", "Reconexiones", "counter"),
+            ("latencia_envio_ms", "lat_ultima_ms", "Encolado -> enviado de la última trama (ms)", "gauge"),
+        ):
+            metricas.medidor("transmisor_destino_" + nombre, por_destino(clave), ayuda,
+                             etiqueta="destino", tipo=tipo)
+
+    def enviar(self, datos):
+        datos = bytes(datos)
+        for d in self.destinos:
+            d.encolar(datos)
+
+    def estadisticas(self):
+        return [d.estadisticas() for d in self.destinos]
+
+    def resumen(self):
+        return " | ".join(
+            f"{e['destino']}: {e['enviados']} env, {e['descartados']} desc, "
+            f"lat {e['lat_media_ms']:.1f}/{e['lat_max_ms']:.1f} ms"
+            for e in self.estadisticas()
+        )
+
+    def cerrar(self):
+        for d in self.destinos:
+            d.cerrar()
@@ -0,0 +1,218 @@
+# generador.py - Generador de carga sintética: reemplaza al dsPIC + transmisor serie
+#
+# Arma las tramas igual que el transmisor ("hola" + 64 magnitudes -> PAM4, con
+# mod_pam4_desde_bytes) pero con espectros sintéticos, y simula N transmisores a la
+# vez, cada uno con su conexión TCP, su stream y su seq (protocolo v2, pam4/sobre.py).
+#
+# Formas de espectro (--forma):
+#   ruido    magnitudes al azar en cada trama
+#   plano    todas iguales (--nivel)
+#   tono     un pico en --frecuencia Hz, con un poco de ruido
+#   barrido  un tono que recorre de 100 a 6400 Hz en --periodo tramas
+#   rosa     caída 1/f, con ruido
+#
+# Para no gastar CPU por trama, cada transmisor arma de entrada un banco de
+# BANCO tramas ya moduladas y ensobradas (con su CRC) y después solo actualiza seq y
+# timestamp de cada lote y lo manda en una escritura.
+#
+# Tasa: --fps por transmisor (0 = lo más rápido que dé la línea). Con --procesos P
+# los transmisores se reparten en P procesos, para usar varios núcleos.
+#
+#   python generador.py --destino 127.0.0.1:5051 --tx 8 --fps 500 --duracion 30
+#   python generador.py --tx 16 --fps 0 --procesos 4 --forma barrido
+
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pam4 import registro, sobre
+from PF_transmisor_pam4_serial_hola_1 import freqs, mod_pam4_desde_bytes
+
+FORMAS = ("ruido", "plano", "tono", "barrido", "rosa")
+BANCO = 256    # tramas distintas por transmisor (se repiten en ciclo)
+LOTE = 64      # tramas por escritura como máximo
+PALABRA = b"hola"
+
+log = registro.obtener("generador")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Generador de carga PAM4 (N transmisores sintéticos)")
+    ap.add_argument("--destino", default="127.0.0.1:5051",
+                    help="host:puerto del canal (o del monitor/receptor) (default %(default)s)")
+    ap.add_argument("--tx", type=int, default=1, help="transmisores simulados (default %(default)s)")
+    ap.add_argument("--stream-base", type=int, default=1,
+                    help="stream del primer transmisor; los demás siguen (0 = los asigna el canal)")
+    ap.add_argument("--fps", type=float, default=100,
+                    help="tramas por segundo de cada transmisor; 0 = lo más rápido posible")
+    ap.add_argument("--duracion", type=float, default=10, help="segundos (0 = hasta Ctrl-C)")
+    ap.add_argument("--procesos", type=int, default=1,
+                    help="procesos entre los que se reparten los transmisores")
+    ap.add_argument("--lote", type=int, default=LOTE, help="tramas por escritura como máximo")
+    ap.add_argument("--forma", choices=FORMAS, default="ruido")
+    ap.add_argument("--nivel", type=int, default=128, help="magnitud de 'plano' y pico de 'tono'")
+    ap.add_argument("--frecuencia", type=float, default=1000, help="Hz del tono")
+    ap.add_argument("--periodo", type=int, default=BANCO, help="tramas de un barrido completo")
+    ap.add_argument("--protocolo", choices=("v2", "legacy"), default="v2")
+    ap.add_argument("--semilla", type=int, help="para espectros reproducibles")
+    ap.add_argument("--log", default="info", choices=registro.NIVELES)
+    return ap.parse_args()
+
+
+# --- Espectros sintéticos: (k, 64) uint8 ---
+def espectros(forma, k, rng, nivel=128, frecuencia=1000.0, periodo=BANCO):
+    f = np.asarray(freqs, dtype=float)
+    if forma == "ruido":
+        return rng.integers(0, 256, (k, len(f)), dtype=np.uint8)
+    if forma == "plano":
+        m = np.full((k, len(f)), float(nivel))
+    elif forma == "tono":
+        m = nivel * np.exp(-0.5 * ((f - frecuencia) / 100.0) ** 2)[None, :].repeat(k, 0)
+    elif forma == "barrido":
+        centro = f[0] + (f[-1] - f[0]) * ((np.arange(k) % periodo) / periodo)
+        m = nivel * np.exp(-0.5 * ((f[None, :] - centro[:, None]) / 100.0) ** 2)
+    elif forma == "rosa":
+        m = np.repeat((255 * f[0] / f)[None, :], k, 0)
+    else:
+        raise ValueError(f"forma de espectro desconocida: {forma!r} (opciones: {', '.join(FORMAS)})")
+    if forma != "plano":
+        m += rng.normal(0, 4, m.shape)
+    return np.clip(m, 0, 255).astype(np.uint8)
+
+
+def banco(cfg, stream, rng):
+    """BANCO tramas de un transmisor, moduladas como en el transmisor y ya ensobradas."""
+    mags = espectros(cfg["forma"], BANCO, rng, cfg["nivel"], cfg["frecuencia"], cfg["periodo"])
+    amplitudes = np.hstack([np.frombuffer(PALABRA * BANCO, np.uint8).reshape(BANCO, -1), mags])
+    datos, _ = mod_pam4_desde_bytes(amplitudes.tobytes())  # el codec procesa el banco entero
+    return sobre.armar(stream, 0, datos)
+
+
+class TxSintetico:
+    """Un transmisor simulado: conexión propia, banco de tramas, seq y tasa."""
+
+    def __init__(self, cfg, stream, rng):
+        self.stream = stream
+        self.fps = cfg["fps"]
+        self.lote = max(1, cfg["lote"])
+        self.crudo = cfg["protocolo"] == "legacy"
+        self.banco = banco(cfg, stream, rng)
+        self.seq = 0
+        self.enviadas = 0
+        self.bytes = 0
+        self.sock = socket.create_connection(cfg["destino"])
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def pendientes(self, transcurrido):
+        """Tramas que ya deberían haber salido y todavía no."""
+        if self.fps <= 0:
+            return self.lote
+        return min(self.lote, int(transcurrido * self.fps) - self.enviadas)
+
+    def enviar(self, k):
+        idx = (self.seq + np.arange(k)) % BANCO
+        s = self.banco[idx]  # copia: el banco no se toca
+        s["seq"] = (self.seq + np.arange(k, dtype=np.uint64)) % sobre.SEQ_MOD
+        s["timestamp"] = sobre.timestamp_us()
+        datos = s["payload"].tobytes() if self.crudo else s.tobytes()
+        self.sock.sendall(datos)
+        self.seq = (self.seq + k) % sobre.SEQ_MOD
+        self.enviadas += k
+        self.bytes += len(datos)
+
+    def cerrar(self):
+        self.sock.close()
+
+
+def correr(cfg, streams, nivel_log):
+    """Corre un grupo de transmisores en este proceso -> lista de estadísticas por TX.
+
+    Un solo hilo los atiende por turno; sin tope de tasa (fps 0) cada uno manda un
+    lote por vuelta, con tope manda lo que le toca y el hilo duerme hasta la próxima trama.
+    """
+    registro.configurar(nivel_log)
+    rng = np.random.default_rng(None if cfg["semilla"] is None else cfg["semilla"] + streams[0])
+    txs = [TxSintetico(cfg, st, rng) for st in streams]
+    inicio = time.perf_counter()
+    fin = inicio + cfg["duracion"] if cfg["duracion"] > 0 else float("inf")
+    error = None
+    try:
+        while True:
+            ahora = time.perf_counter()
+            if ahora >= fin:
+                break
+            enviado = False
+            for tx in txs:
+                k = tx.pendientes(ahora - inicio)
+                if k > 0:
+                    tx.enviar(k)
+                    enviado = True
+            if not enviado:
+                # La próxima trama de cualquier TX (todos tienen la misma tasa)
+                proxima = inicio + (min(tx.enviadas for tx in txs) + 1) / cfg["fps"]
+                time.sleep(max(0.0, min(proxima, fin) - time.perf_counter()))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        error = str(e)
+        log.error("⚠ error enviando: %s", e)
+    dt = time.perf_counter() - inicio
+    for tx in txs:
+        tx.cerrar()
+    registro.cerrar()
+    return [{"stream": tx.stream, "tramas": tx.enviadas, "bytes": tx.bytes, "segundos": dt,
+             "error": error} for tx in txs]
+
+
+def informe(resultados, fps):
+    tramas = sum(r["tramas"] for r in resultados)
+    total = sum(r["bytes"] for r in resultados)
+    dt = max(r["segundos"] for r in resultados) or 1e-9
+    for r in resultados:
+        log.info("  TX%d: %d tramas, %.0f tramas/s", r["stream"], r["tramas"], r["tramas"] / r["segundos"])
+    pedido = f"{fps * len(resultados):.0f}" if fps > 0 else "sin tope"
+    log.info("📊 %d transmisores: %d tramas en %.2f s = %.0f tramas/s (pedido: %s), "
+             "%.2f MB/s, %.2f Msímbolos/s", len(resultados), tramas, dt, tramas / dt, pedido,
+             total / dt / 1e6, tramas * 4 * sobre.FRAME_BYTES / dt / 1e6)
+    errores = {r["error"] for r in resultados if r["error"]}
+    for e in errores:
+        log.warning("⚠ %s", e)
+
+
+def main():
+    args = parse_args()
+    registro.configurar(args.log)
+    host, _, port = args.destino.rpartition(":")
+    cfg = {"destino": (host, int(port)), "fps": args.fps, "duracion": args.duracion,
+           "lote": args.lote, "forma": args.forma, "nivel": args.nivel,
+           "frecuencia": args.frecuencia, "periodo": max(1, args.periodo),
+           "protocolo": args.protocolo, "semilla": args.semilla}
+    streams = [args.stream_base + i if args.stream_base else 0 for i in range(args.tx)]
+    procesos = max(1, min(args.procesos, args.tx))
+    grupos = [streams[i::procesos] for i in range(procesos)]
+    log.info("Generando %s hacia %s: %d TX a %s tramas/s cada uno, %d proceso(s)", args.forma,
+             args.destino, args.tx, args.fps or "máximo", procesos)
+
+    try:
+        if procesos == 1:
+            resultados = correr(cfg, streams, args.log)
+            registro.configurar(args.log)
+        else:
+            with mp.Pool(procesos) as pool:
+                partes = pool.starmap(correr, [(cfg, g, args.log) for g in grupos])
+            resultados = [r for parte in partes for r in parte]
+        informe(resultados, args.fps)
+    except KeyboardInterrupt:
+        log.info("Generador detenido.")
+    finally:
+        registro.cerrar()
+
+
+if __name__ == "__main__":
+    main()
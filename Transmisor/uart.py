@@ -0,0 +1,64 @@
+# uart.py - Lectura de tramas del dsPIC (FFT.c) por el puerto serie
+#
+# Formato de cada trama: "Inicio" + 64 magnitudes (bytes crudos) + "Fin".
+#
+# ParserTramasUART es una máquina de estados que recibe trozos de cualquier tamaño
+# (lo que haya en in_waiting) y guarda entre trozos en qué parte de la trama está:
+#   INICIO -> busca "Inicio" (lo anterior se descarta)
+#   DATOS  -> junta 64 bytes (pueden contener cualquier valor, incluso "Fin")
+#   FIN    -> busca "Fin"
+# Cada búsqueda arranca donde terminó la anterior y el buffer se compacta una vez
+# por trozo, así el costo es lineal en los bytes recibidos.
+
+INICIO = b"Inicio"
+FIN = b"Fin"
+N_MAGNITUDES = 64
+
+_BUSCA_INICIO, _DATOS, _BUSCA_FIN = range(3)
+
+
+class ParserTramasUART:
+    def __init__(self, n_magnitudes=N_MAGNITUDES):
+        self.n = n_magnitudes
+        self.estado = _BUSCA_INICIO
+        self.buf = bytearray()
+
+    def alimentar(self, chunk):
+        """Agrega bytes recibidos -> lista de tramas completas (bytes de 64)."""
+        buf = self.buf
+        buf += chunk
+        tramas = []
+        i = 0
+        while True:
+            if self.estado == _BUSCA_INICIO:
+                j = buf.find(INICIO, i)
+                if j < 0:
+                    i = max(i, len(buf) - len(INICIO) + 1)  # por si el delimitador quedó partido
+                    break
+                i = j + len(INICIO)
+                self.estado = _DATOS
+            elif self.estado == _DATOS:
+                if len(buf) - i < self.n:
+                    break
+                tramas.append(bytes(buf[i:i + self.n]))
+                i += self.n
+                self.estado = _BUSCA_FIN
+            else:
+                j = buf.find(FIN, i)
+                if j < 0:
+                    i = max(i, len(buf) - len(FIN) + 1)
+                    break
+                i = j + len(FIN)
+                self.estado = _BUSCA_INICIO
+        del buf[:i]
+        return tramas
+
+
+def leer_tramas(ser, parser=None):
+    """Generador de tramas de 64 magnitudes leyendo en bloque del puerto serie."""
+    parser = parser or ParserTramasUART()
+    while True:
+        # Todo lo disponible de una vez; si no hay nada, read(1) espera hasta el timeout
+        chunk = ser.read(ser.in_waiting or 1)
+        if chunk:
+            yield from parser.alimentar(chunk)
@@ -0,0 +1,90 @@
+# visualizador.py - Gráficos del transmisor en un proceso aparte
+#
+# El lazo de captura solo publica la última trama (68 bytes) en una cola de
+# multiprocessing de tamaño 1; si el visualizador todavía no la tomó, la nueva se
+# descarta. El proceso del visualizador dibuja a su propio ritmo (fps), así
+# matplotlib nunca frena la captura ni el envío.
+
+import multiprocessing as mp
+import os
+import queue
+import sys
+
+FPS = 2
+
+
+class Visualizador:
+    def __init__(self, fps=FPS):
+        self.cola = mp.Queue(maxsize=1)
+        self.proc = mp.Process(target=_proceso, args=(self.cola, fps), daemon=True)
+        self.proc.start()
+
+    def publicar(self, trama):
+        try:
+            self.cola.put_nowait(bytes(trama))
+        except queue.Full:
+            pass  # el visualizador muestrea, no necesita todas las tramas
+
+    def cerrar(self):
+        try:
+            self.cola.put_nowait(None)
+        except queue.Full:
+            pass
+        self.proc.join(timeout=2)
+        if self.proc.is_alive():
+            self.proc.terminate()
+
+
+def _proceso(cola, fps):
+    import matplotlib.pyplot as plt
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from pam4 import codec
+    from pam4.reconstruccion import FRECUENCIAS, Reconstructor
+
+    freqs = FRECUENCIAS
+    # Solo se calcula la ventana de zoom que se grafica (10 ms)
+    reconstructor = Reconstructor(freqs, fs=44100, duracion=0.1, ventana=0.010)
+    periodo = 1.0 / fps
+
+    plt.ion()
+    while True:
+        try:
+            trama = cola.get(timeout=periodo)
+        except queue.Empty:
+            plt.pause(0.01)
+            continue
+        if trama is None:
+            break
+
+        amplitudes = list(trama[4:])
+        symbols = codec.bytes_a_simbolos(trama)
+
+        # Graficar
+        plt.clf()
+
+        # 1. Frecuencias y amplitudes
+        plt.subplot(3, 1, 1)
+        plt.bar(freqs, amplitudes, width=80)
+        plt.title("Magnitudes de Frecuencia recibidas (8 bits)")
+        plt.xlabel("Frecuencia [Hz]")
+        plt.ylabel("Valor (0–255)")
+
+        # 2. Histograma de símbolos PAM4
+        plt.subplot(3, 1, 2)
+        counts = codec.contar_simbolos(symbols)
+        plt.bar(range(4), counts, tick_label=["0", "1", "2", "3"])
+        plt.title("Histograma de símbolos PAM4")
+        plt.xlabel("Símbolo")
+        plt.ylabel("Cantidad")
+
+        # 3. Señal reconstruida (Zoom 10 ms)
+        plt.subplot(3, 1, 3)
+        plt.plot(reconstructor.t, reconstructor.senal(amplitudes))
+        plt.title("Señal reconstruida Simulada con fase 0 (Zoom 10 ms)")
+        plt.xlabel("Tiempo [s]")
+        plt.ylabel("Amplitud")
+
+        plt.tight_layout()
+        plt.pause(periodo)
+    plt.close("all")
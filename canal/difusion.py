@@ -0,0 +1,214 @@
+# difusion.py - Fan-out pub/sub del canal (asyncio)
+#
+# Difusor.publicar() nunca bloquea: deja el lote en la cola acotada de cada
+# suscriptor y vuelve. Cada suscriptor tiene su propia tarea de envío, así un
+# consumidor lento (o colgado) solo se atrasa él: ni los demás suscriptores ni
+# los transmisores lo esperan.
+#
+# Política cuando la cola de un suscriptor está llena:
+#   descartar_viejo : se tira el lote más viejo de la cola (por defecto)
+#   descartar_nuevo : se tira el lote que llega
+#   desconectar     : se corta la conexión y se vacía la cola; los suscriptores
+#                     salientes se reconectan, los entrantes se dan de baja
+#
+# Suscriptores salientes: el canal se conecta a host:puerto (receptor, monitor, ...).
+# Suscriptores entrantes: cualquiera que se conecte al puerto de suscripción.
+# Mientras un suscriptor no está conectado sus lotes no se acumulan.
+
+import asyncio
+from collections import deque
+
+from pam4 import registro  # relay.py agrega la raíz del repo al sys.path
+
+POLITICAS = ("descartar_viejo", "descartar_nuevo", "desconectar")
+MAX_COLA = 64
+RECONEXION = 3
+
+log = registro.obtener("canal.difusion")
+
+
+class Suscriptor:
+    def __init__(self, nombre, destino=None, max_cola=MAX_COLA, politica=POLITICAS[0]):
+        if politica not in POLITICAS:
+            raise ValueError(f"política desconocida: {politica!r} (opciones: {', '.join(POLITICAS)})")
+        self.nombre = nombre
+        self.destino = destino  # (host, port) si es saliente; None si es entrante
+        self.max_cola = max(1, int(max_cola))
+        self.politica = politica
+        self.cola = deque()
+        self.hay_datos = asyncio.Event()
+        self.writer = None
+        self.tarea = None
+
+        # Estadísticas (en lotes)
+        self.publicados = 0
+        self.enviados = 0
+        self.descartados = 0
+        self.sin_conexion = 0
+        self.desconexiones = 0
+        self.lag_max = 0
+
+    def __str__(self):
+        return (f"{self.nombre}: {'conectado' if self.writer else 'desconectado'} "
+                f"lag={self.lag} (máx {self.lag_max}) enviados={self.enviados} "
+                f"descartados={self.descartados} sin_conexion={self.sin_conexion} "
+                f"desconexiones={self.desconexiones} [{self.politica}, cola {self.max_cola}]")
+
+    @property
+    def lag(self):
+        """Lotes publicados que todavía esperan en la cola de este suscriptor."""
+        return len(self.cola)
+
+    def estadisticas(self):
+        return {
+            "conectado": self.writer is not None,
+            "politica": self.politica,
+            "max_cola": self.max_cola,
+            "lag": self.lag,
+            "lag_max": self.lag_max,
+            "pendiente_bytes": self.writer.transport.get_write_buffer_size() if self.writer else 0,
+            "publicados": self.publicados,
+            "enviados": self.enviados,
+            "descartados": self.descartados,
+            "sin_conexion": self.sin_conexion,
+            "desconexiones": self.desconexiones,
+        }
+
+    def encolar(self, datos):
+        self.publicados += 1
+        if self.writer is None:
+            self.sin_conexion += 1
+            return
+        if len(self.cola) >= self.max_cola:
+            if self.politica == "descartar_nuevo":
+                self.descartados += 1
+                return
+            if self.politica == "desconectar":
+                log.warning("[⚠️] %s no da abasto, se corta la conexión", self.nombre)
+                self.descartados += len(self.cola) + 1
+                self.cola.clear()
+                self._cortar()
+                return
+            self.cola.popleft()
+            self.descartados += 1
+        self.cola.append(datos)
+        self.lag_max = max(self.lag_max, len(self.cola))
+        self.hay_datos.set()
+
+    def _cortar(self):
+        w = self.writer
+        self.writer = None
+        self.desconexiones += 1
+        if w:
+            w.transport.abort()  # sin esperar a que se vacíe lo pendiente
+        self.hay_datos.set()  # despierta a la tarea de envío para que termine
+
+    async def _vigilar(self, reader, writer):
+        # Solo para enterarse cuando el otro extremo cierra; lo que mande se descarta
+        try:
+            while await reader.read(4096):
+                pass
+        except (OSError, ConnectionError):
+            pass
+        if self.writer is writer:
+            self._cortar()
+
+    async def atender(self, reader, writer):
+        """Envía la cola por esta conexión hasta que se corte."""
+        self.writer = writer
+        vigia = asyncio.ensure_future(self._vigilar(reader, writer))
+        try:
+            while self.writer is writer:
+                await self.hay_datos.wait()
+                self.hay_datos.clear()
+                if self.writer is not writer:
+                    break
+                lotes = list(self.cola)
+                self.cola.clear()
+                writer.writelines(lotes)
+                await writer.drain()  # solo espera esta tarea; mientras tanto se llena la cola
+                self.enviados += len(lotes)
+        except (OSError, ConnectionError) as e:
+            log.warning("[⚠️] %s desconectado: %s", self.nombre.capitalize(), e)
+        finally:
+            vigia.cancel()
+            if self.writer is writer:
+                self.writer = None
+                self.desconexiones += 1
+            self.cola.clear()
+            writer.close()
+
+    async def correr(self):
+        """Suscriptor saliente: conexión persistente con reconexión."""
+        host, port = self.destino
+        while True:
+            try:
+                log.info("🔌 Conectando con el %s %s:%s...", self.nombre, host, port)
+                reader, writer = await asyncio.open_connection(host, port)
+                log.info("✅ Conectado con el %s.", self.nombre)
+                await self.atender(reader, writer)
+            except OSError as e:
+                log.warning("[⚠️] %s desconectado: %s", self.nombre.capitalize(), e)
+            await asyncio.sleep(RECONEXION)
+
+    def cerrar(self):
+        if self.tarea:
+            self.tarea.cancel()
+        if self.writer:
+            self._cortar()
+
+
+class Difusor:
+    def __init__(self, max_cola=MAX_COLA, politica=POLITICAS[0]):
+        if politica not in POLITICAS:
+            raise ValueError(f"política desconocida: {politica!r} (opciones: {', '.join(POLITICAS)})")
+        self.max_cola = max_cola
+        self.politica = politica
+        self.suscriptores = {}
+
+    def suscribir(self, nombre, destino=None, max_cola=None, politica=None):
+        """Agrega un suscriptor; con destino=(host, port) el canal se conecta a él."""
+        if nombre in self.suscriptores:
+            raise ValueError(f"ya existe el suscriptor {nombre!r}")
+        s = Suscriptor(nombre, destino, max_cola or self.max_cola, politica or self.politica)
+        self.suscriptores[nombre] = s
+        if destino:
+            s.tarea = asyncio.ensure_future(s.correr())
+        return s
+
+    def desuscribir(self, nombre):
+        s = self.suscriptores.pop(nombre, None)
+        if s is None:
+            raise ValueError(f"no existe el suscriptor {nombre!r}")
+        s.cerrar()
+
+    def publicar(self, datos):
+        """Entrega datos (bytes, no se copian) a todos los suscriptores sin bloquear."""
+        for s in list(self.suscriptores.values()):
+            s.encolar(datos)
+
+    async def servir(self, host, port):
+        """Acepta suscriptores entrantes en host:port."""
+        return await asyncio.start_server(self._entrante, host, port)
+
+    async def _entrante(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        nombre = f"{peer[0]}:{peer[1]}"
+        log.info("[SUB] Suscriptor conectado %s", nombre)
+        s = self.suscribir(nombre)
+        try:
+            await s.atender(reader, writer)
+        finally:
+            if self.suscriptores.get(nombre) is s:
+                del self.suscriptores[nombre]
+            log.info("[SUB] Suscriptor desconectado %s", nombre)
+
+    def estadisticas(self):
+        return {n: s.estadisticas() for n, s in self.suscriptores.items()}
+
+    def resumen(self):
+        return " | ".join(str(s) for s in self.suscriptores.values()) or "sin suscriptores"
+
+    def cerrar(self):
+        for nombre in list(self.suscriptores):
+            self.desuscribir(nombre)
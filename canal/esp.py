@@ -6,6 +6,15 @@ import time
 import _thread
 import random
 
+from pam4 import codec  # copiar la carpeta pam4/ a la ESP32
+from pam4.enmarcado import Enmarcador, FRAME_BYTES
+from pam4 import registro, sobre
+
+# --- Logging (pam4/registro.py): el detalle por lote y por símbolo va en debug ---
+registro.configurar("info")
+log = registro.obtener("canal")
+lotes_log = registro.Limitador(log, por_segundo=1)
+
 # --- Config WiFi ---
 SSID = "UBP"
 PASSWORD = "pascal25"
@@ -23,12 +32,22 @@ MONITOR_PORT = 8100
 pc_sock = None
 pc_lock = _thread.allocate_lock()
 modo_error = False
+prob_error = 0.05
+
+# --- Fan-out: cola acotada e hilo de envío por suscriptor ---
+MAX_COLA = 8                 # lotes pendientes por suscriptor (poca RAM)
+POLITICA = "descartar_viejo"  # descartar_viejo | descartar_nuevo | desconectar
+
+# --- Fuentes: ID de transmisor + número de secuencia en un sobre v2 (pam4/sobre.py) ---
+SOBRE = True  # False: salida en tramas crudas de 68 bytes (receptores viejos)
+fuentes_lock = _thread.allocate_lock()
+ids_por_ip = {}      # ip -> IDs que ya usó (al reconectarse recupera el suyo)
+fuentes_activas = {}  # fuente -> ip
+seq_fuente = {}       # fuente -> seq de la próxima trama
+proxima_fuente = 1
 
-# --- Sockets persistentes ---
-receiver_sock = None
-monitor_sock = None
-receiver_lock = _thread.allocate_lock()
-monitor_lock = _thread.allocate_lock()
+# --- Tramas: 68 bytes = 272 símbolos ---
+SIMBOLOS_TRAMA = FRAME_BYTES * 4
 
 # --- Prefijo "hola" en PAM4 (16 símbolos) ---
 PREFIJO_HOLA = [1, 2, 2, 0,
@@ -40,54 +59,59 @@ PREFIJO_HOLA = [1, 2, 2, 0,
 wifi = network.WLAN(network.STA_IF)
 wifi.active(True)
 wifi.connect(SSID, PASSWORD)
-print("Conectando a WiFi...")
+log.info("Conectando a WiFi...")
 while not wifi.isconnected():
     time.sleep(0.5)
-print("✅ Conectado a WiFi. IP local:", wifi.ifconfig()[0])
+log.info("✅ Conectado a WiFi. IP local: %s", wifi.ifconfig()[0])
 
 
 # --- Decodificación PAM4 ---
 def decodificar_pam4(data):
-    simbolos = []
-    for b in data:
-        simbolos.append((b >> 6) & 0b11)
-        simbolos.append((b >> 4) & 0b11)
-        simbolos.append((b >> 2) & 0b11)
-        simbolos.append(b & 0b11)
-    return simbolos
+    return codec.bytes_a_simbolos(data)
 
 
-# --- Introducir errores aleatorios (SIEMPRE protegidos los primeros 16 símbolos) ---
+# --- Introducir errores aleatorios (SIEMPRE protegidos los primeros 16 símbolos de cada trama) ---
 def introducir_error(simbolos):
-    PROB = 0.05
+    PROB = prob_error
     total = len(simbolos)
+    depurar = log.isEnabledFor(registro.DEBUG)
+    alterados = 0
 
-    # Nunca modificar los primeros 16 símbolos del paquete
-    limite_protegido = 16 if total >= 16 else total
-
-    for i in range(limite_protegido, total):
+    for i in range(total):
+        # Nunca modificar los primeros 16 símbolos de cada trama
+        if i % SIMBOLOS_TRAMA < 16:
+            continue
         if random.random() < PROB:
             original = simbolos[i]
             opciones = [n for n in (0, 1, 2, 3) if n != original]
             simbolos[i] = random.choice(opciones)
-            print(f"⚠️ [ERROR] símbolo {i}: {original} -> {simbolos[i]}")
+            alterados += 1
+            if depurar:
+                log.debug("⚠️ [ERROR] símbolo %d: %d -> %d", i, original, simbolos[i])
 
-    return simbolos
+    return simbolos, alterados
 
 
 # --- Reensamblar símbolos ---
 def empaquetar_pam4(simbolos):
-    b = bytearray()
-    for i in range(0, len(simbolos), 4):
-        grupo = simbolos[i:i + 4]
-        while len(grupo) < 4:
-            grupo.append(0)
-        val = (grupo[0] << 6) | (grupo[1] << 4) | (grupo[2] << 2) | grupo[3]
-        b.append(val)
-    return bytes(b)
+    return codec.simbolos_a_bytes(simbolos)
 
 
 # --- Cliente con la PC administradora ---
+# --- ERROR_CONFIG tasa=... semilla=... (la ESP solo implementa el modelo uniforme) ---
+def configurar_errores(txt):
+    global prob_error
+    for par in txt.split():
+        clave, _, valor = par.partition("=")
+        if clave == "tasa":
+            prob_error = float(valor)
+        elif clave == "semilla":
+            random.seed(int(valor))
+        elif clave == "modelo" and valor != "uniforme":
+            log.warning("[⚠️] Modelo no disponible en la ESP (solo uniforme): %s", valor)
+    log.info("[⚙️] Errores: tasa = %s", prob_error)
+
+
 def pc_control_client():
     global pc_sock, modo_error
     while True:
@@ -96,23 +120,45 @@ def pc_control_client():
             s.connect((PC_ADMIN_IP, CONTROL_PORT))
             with pc_lock:
                 pc_sock = s
-            print("🖥️ Conectado con la PC administradora")
+            log.info("🖥️ Conectado con la PC administradora")
             s.sendall(("INFO:ESP_IP=" + wifi.ifconfig()[0] + "\n").encode())
 
             while True:
                 data = s.recv(1024)
                 if not data:
                     break
-                cmd = data.decode().strip()
-                if cmd == "MODO_ERROR_ON":
-                    modo_error = True
-                    print("[⚠️] Modo error ACTIVADO")
-                elif cmd == "MODO_ERROR_OFF":
-                    modo_error = False
-                    print("[✅] Modo error DESACTIVADO")
+                for cmd in data.decode().split("\n"):
+                    cmd = cmd.strip()
+                    if cmd == "MODO_ERROR_ON":
+                        modo_error = True
+                        log.warning("[⚠️] Modo error ACTIVADO")
+                    elif cmd == "MODO_ERROR_OFF":
+                        modo_error = False
+                        log.info("[✅] Modo error DESACTIVADO")
+                    elif cmd.startswith("ERROR_CONFIG"):
+                        try:
+                            configurar_errores(cmd[len("ERROR_CONFIG"):])
+                        except ValueError as e:
+                            log.error("[❌] ERROR_CONFIG inválido: %s", e)
+                    elif cmd.startswith("DESUSCRIBIR"):
+                        desuscribir(cmd[len("DESUSCRIBIR"):].strip())
+                    elif cmd.startswith("SUSCRIBIR"):
+                        try:
+                            suscribir(cmd[len("SUSCRIBIR"):])
+                        except (ValueError, IndexError) as e:
+                            log.error("[❌] SUSCRIBIR inválido: %s", e)
+                    elif cmd == "info":
+                        with suscriptores_lock:
+                            lineas = ["INFO:suscriptor " + str(sub) for sub in suscriptores]
+                        with fuentes_lock:
+                            for f, ip in fuentes_activas.items():
+                                lineas.append("INFO:TX{} {} seq={}".format(f, ip, seq_fuente[f]))
+                        with pc_lock:
+                            for linea in lineas:
+                                s.sendall((linea + "\n").encode())
 
         except Exception as e:
-            print("[❌] Error conexión con Admin:", e)
+            log.warning("[❌] Error conexión con Admin: %s", e)
         finally:
             try:
                 s.close()
@@ -123,94 +169,247 @@ def pc_control_client():
             time.sleep(5)
 
 
-# --- Clientes persistentes receptor y monitor ---
-def receptor_client():
-    global receiver_sock
-    while True:
+# --- Suscriptores persistentes (receptor, monitor, ...) ---
+# Cada uno tiene su propia cola y su hilo: un consumidor lento solo se atrasa él,
+# no frena a los demás ni al hilo que atiende a los transmisores.
+class Suscriptor:
+    def __init__(self, nombre, ip, port, max_cola=MAX_COLA, politica=POLITICA):
+        self.nombre = nombre
+        self.ip = ip
+        self.port = port
+        self.max_cola = max_cola
+        self.politica = politica
+        self.cola = []
+        self.lock = _thread.allocate_lock()
+        self.sock = None
+        self.activo = True
+        # Estadísticas (en lotes)
+        self.enviados = 0
+        self.descartados = 0
+        self.desconexiones = 0
+        self.lag_max = 0
+        _thread.start_new_thread(self.correr, ())
+
+    def __str__(self):
+        return (f"{self.nombre}: {'conectado' if self.sock else 'desconectado'} "
+                f"lag={len(self.cola)} (máx {self.lag_max}) enviados={self.enviados} "
+                f"descartados={self.descartados} desconexiones={self.desconexiones}")
+
+    def encolar(self, datos):
+        with self.lock:
+            if self.sock is None:
+                return  # sin conexión no se acumula
+            if len(self.cola) >= self.max_cola:
+                if self.politica == "descartar_nuevo":
+                    self.descartados += 1
+                    return
+                if self.politica == "desconectar":
+                    log.warning("[⚠️] %s no da abasto, se corta la conexión", self.nombre)
+                    self.descartados += len(self.cola) + 1
+                    self.cola = []
+                    self._cortar()
+                    return
+                self.cola.pop(0)
+                self.descartados += 1
+            self.cola.append(datos)
+            if len(self.cola) > self.lag_max:
+                self.lag_max = len(self.cola)
+
+    def _cortar(self):
         try:
-            print("🔌 Conectando con el receptor...")
-            s = socket.socket()
-            s.connect((RECEIVER_IP, RECEIVER_PORT))
-            with receiver_lock:
-                receiver_sock = s
-            print("✅ Conectado con el receptor.")
-            while True:
-                time.sleep(1)
-                
-        except Exception as e:
-            print("[⚠️] Receptor desconectado:", e)
-        finally:
+            self.sock.close()
+        except:
+            pass
+        self.sock = None
+        self.desconexiones += 1
+
+    def correr(self):
+        while self.activo:
+            s = None
             try:
-                s.close()
-            except:
-                pass
-            with receiver_lock:
-                receiver_sock = None
-            time.sleep(3)
+                log.info("🔌 Conectando con el %s...", self.nombre)
+                s = socket.socket()
+                s.connect((self.ip, self.port))
+                with self.lock:
+                    self.sock = s
+                log.info("✅ Conectado con el %s.", self.nombre)
+                while self.sock is s:
+                    with self.lock:
+                        lotes = self.cola
+                        self.cola = []
+                    if not lotes:
+                        time.sleep(0.005)
+                        continue
+                    for lote in lotes:
+                        s.sendall(lote)
+                    self.enviados += len(lotes)
 
-
-def monitor_client():
-    global monitor_sock
-    while True:
-        try:
-            print("📡 Conectando con el monitor...")
-            s = socket.socket()
-            s.connect((MONITOR_IP, MONITOR_PORT))
-            with monitor_lock:
-                monitor_sock = s
-            print("✅ Conectado con el monitor.")
-            while True:
-                time.sleep(1)
-                
-        except Exception as e:
-            print("[⚠️] Monitor desconectado:", e)
-        finally:
-            try:
-                s.close()
-            except:
-                pass
-            with monitor_lock:
-                monitor_sock = None
+            except Exception as e:
+                log.warning("[⚠️] %s desconectado: %s", self.nombre, e)
+            finally:
+                with self.lock:
+                    if s is not None and self.sock is s:
+                        self._cortar()
+                    self.cola = []
+                try:
+                    s.close()
+                except:
+                    pass
             time.sleep(3)
 
 
-# --- Enviar datos ---
-def enviar_datos_persistentes(msg_bytes):
-    global receiver_sock, monitor_sock
-
-    with receiver_lock:
-        if receiver_sock:
-            try:
-                receiver_sock.sendall(msg_bytes)
-                print(f"[➡️] Enviado al receptor ({len(msg_bytes)} bytes)")
-            except Exception as e:
-                print("[⚠️] Error enviando al receptor:", e)
-                receiver_sock = None
-        else:
-            print("[⛔] Receptor no conectado")
-
-    with monitor_lock:
-        if monitor_sock:
-            try:
-                monitor_sock.sendall(msg_bytes)
-                print(f"[➡️] Enviado al monitor ({len(msg_bytes)} bytes)")
-            except Exception as e:
-                print("[⚠️] Error enviando al monitor:", e)
-                monitor_sock = None
-        else:
-            print("[⛔] Monitor no conectado")
+suscriptores = [
+    Suscriptor("receptor", RECEIVER_IP, RECEIVER_PORT),
+    Suscriptor("monitor", MONITOR_IP, MONITOR_PORT),
+]
+suscriptores_lock = _thread.allocate_lock()
 
 
-# --- Calcular histograma ---
+# --- Enviar datos (no bloquea: solo encola) ---
+def enviar_datos_persistentes(msg_bytes):
+    with suscriptores_lock:
+        lista = list(suscriptores)
+    for sub in lista:
+        sub.encolar(msg_bytes)
+
+
+# --- SUSCRIBIR nombre ip:puerto [politica] [max_cola] / DESUSCRIBIR nombre ---
+def suscribir(txt):
+    partes = txt.split()
+    ip, _, port = partes[1].rpartition(":")
+    politica = partes[2] if len(partes) > 2 else POLITICA
+    max_cola = int(partes[3]) if len(partes) > 3 else MAX_COLA
+    with suscriptores_lock:
+        suscriptores.append(Suscriptor(partes[0], ip, int(port), max_cola, politica))
+
+
+def desuscribir(nombre):
+    with suscriptores_lock:
+        for sub in suscriptores:
+            if sub.nombre == nombre:
+                suscriptores.remove(sub)
+                sub.activo = False
+                with sub.lock:
+                    if sub.sock:
+                        sub._cortar()
+                return
+
+
+# --- Calcular histograma (solo con log en debug) ---
 def histograma_pam4(simbolos):
-    counts = {0: 0, 1: 0, 2: 0, 3: 0}
-    for s in simbolos:
-        counts[s] += 1
-    total = len(simbolos)
-    print(f"\n📊 [HISTOGRAMA PAM4] Total: {total} símbolos")
-    for nivel in (0, 1, 2, 3):
-        print(f"   Nivel {nivel}: {counts[nivel]}")
-    print()
+    counts = codec.contar_simbolos(simbolos)
+    log.debug("📊 [HISTOGRAMA PAM4] Total: %d símbolos | niveles 0..3: %d %d %d %d",
+              len(simbolos), counts[0], counts[1], counts[2], counts[3])
+
+
+# --- Alta / baja de transmisores (cualquier cantidad) ---
+def alta_fuente(ip):
+    global proxima_fuente
+    with fuentes_lock:
+        fuente = None
+        for f in ids_por_ip.get(ip, []):
+            if f not in fuentes_activas:
+                fuente = f
+                break
+        if fuente is None:
+            fuente = proxima_fuente
+            proxima_fuente += 1
+            ids_por_ip.setdefault(ip, []).append(fuente)
+            seq_fuente[fuente] = 0
+        fuentes_activas[fuente] = ip
+    return fuente
+
+
+def baja_fuente(fuente):
+    with fuentes_lock:
+        fuentes_activas.pop(fuente, None)
+
+
+# --- Procesar un lote de sobres v2: (stream, seq, timestamp, flags, payload, crc) ---
+def procesar_sobres(sobres, fuente):
+    lote = b"".join([sb[4] for sb in sobres])
+    simbolos = decodificar_pam4(lote)
+    n_tramas = len(sobres)
+    if log.isEnabledFor(registro.DEBUG):
+        log.debug("[TX] Lote recibido (%d tramas, %d símbolos). Primeros 16: %s",
+                  n_tramas, len(simbolos), list(simbolos[:16]))
+        histograma_pam4(simbolos)
+
+    alterados = 0
+    if modo_error:
+        simbolos, alterados = introducir_error(simbolos)
+    if lotes_log.permitir():
+        lotes_log.log("[TX] TX%d: lote de %d tramas, %d símbolos alterados", fuente, n_tramas, alterados)
+
+    msg_modulado = empaquetar_pam4(simbolos)
+    if SOBRE:
+        # Mismo encabezado y CRC original: el receptor detecta los símbolos alterados
+        out = bytearray()
+        for i, (stream, seq, ts, flags, _, crc) in enumerate(sobres):
+            payload = msg_modulado[i * FRAME_BYTES:(i + 1) * FRAME_BYTES]
+            out += sobre.empaquetar(stream or fuente, seq, ts, flags, payload, crc)
+        msg_modulado = out
+    enviar_datos_persistentes(msg_modulado)
+
+
+# --- Tramas crudas de 68 bytes (transmisor sin protocolo v2): el canal arma los sobres ---
+def procesar_lote(lote, fuente):
+    # Cada transmisor tiene su propio hilo: seq_fuente[fuente] lo toca solo este
+    seq = seq_fuente[fuente]
+    ts = sobre.timestamp_us()
+    sobres = []
+    for i in range(0, len(lote), FRAME_BYTES):
+        payload = bytes(lote[i:i + FRAME_BYTES])
+        sobres.append((fuente, seq, ts, sobre.FLAG_CANAL, payload, sobre.crc(payload)))
+        seq += 1
+    seq_fuente[fuente] = seq % sobre.SEQ_MOD
+    procesar_sobres(sobres, fuente)
+
+
+# --- Conexión larga con un transmisor: sobres v2 o tramas crudas de 68 bytes ---
+def atender_tx(conn, addr):
+    fuente = alta_fuente(addr[0])
+    log.info("[TX] Conexión desde %s -> TX%d", addr, fuente)
+    try:
+        inicio = b""
+        while len(inicio) < 3:  # los primeros bytes dicen el protocolo
+            data = conn.recv(3 - len(inicio))
+            if not data:
+                return
+            inicio += data
+        v2 = sobre.es_sobre(inicio)
+        lector = sobre.LectorSobres() if v2 else Enmarcador(FRAME_BYTES)
+        if not v2:
+            log.info("[TX] TX%d manda tramas crudas de 68 bytes (sin protocolo v2)", fuente)
+        libre = lector.espacio()
+        libre[:3] = inicio
+        n = 3
+        while True:
+            if v2:
+                sobres, _ = lector.avanzar(n)
+                if sobres:
+                    procesar_sobres(sobres, fuente)
+            else:
+                lote = lector.avanzar(n)
+                if lote:
+                    procesar_lote(lote, fuente)
+            # Una sola lectura con lo que haya llegado: readinto en un socket bloqueante
+            # espera a llenar todo el espacio y retendría las tramas hasta juntar ~30
+            espacio = lector.espacio()
+            data = conn.recv(len(espacio))
+            n = len(data)
+            if not n:
+                break
+            espacio[:n] = data
+    except Exception as e:
+        log.error("[Error canal interno]: %s", e)
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+        baja_fuente(fuente)
+        log.info("[TX] Desconectado %s", addr)
 
 
 # --- Servidor del canal ---
@@ -218,54 +417,20 @@ def canal_server():
     s = socket.socket()
     s.bind(('', CHANNEL_PORT))
     s.listen(5)
-    print(f"[📡] Esperando transmisores en puerto {CHANNEL_PORT}...")
+    log.info("[📡] Esperando transmisores en puerto %d...", CHANNEL_PORT)
 
     while True:
         try:
             conn, addr = s.accept()
-            print("[TX] Conexión desde", addr)
-            try:
-                data = conn.recv(2048)
-                if not data:
-                    conn.close()
-                    continue
-
-                simbolos = decodificar_pam4(data)
-                print(f"[TX] Paquete recibido ({len(simbolos)} símbolos).")
-
-                print("Primeros 16 símbolos recibidos:", simbolos[:16])
-
-                histograma_pam4(simbolos)
-
-                if modo_error:
-                    simbolos = introducir_error(simbolos)
-                else:
-                    print("✅ Modo error desactivado (sin alteraciones).")
-
-                msg_modulado = empaquetar_pam4(simbolos)
-                enviar_datos_persistentes(msg_modulado)
-
-                with pc_lock:
-                    if pc_sock:
-                        pc_sock.sendall(b"[INFO] Paquete PAM4 procesado\n")
-
-            except Exception as e:
-                print("[Error canal interno]:", e)
-            finally:
-                try:
-                    conn.close()
-                except:
-                    pass
+            _thread.start_new_thread(atender_tx, (conn, addr))
         except Exception as e:
-            print("[Error aceptando conexión]:", e)
+            log.error("[Error aceptando conexión]: %s", e)
             time.sleep(0.05)
 
 
 # --- Lanzar hilos ---
 _thread.start_new_thread(pc_control_client, ())
 _thread.start_new_thread(canal_server, ())
-_thread.start_new_thread(receptor_client, ())
-_thread.start_new_thread(monitor_client, ())
 
 # --- Mantener vivo ---
 while True:
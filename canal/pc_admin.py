@@ -1,6 +1,11 @@
+import json
+import os
 import socket
+import sys
 import threading
-from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pam4 import codec
 
 HOST = '0.0.0.0'
 CONTROL_PORT = 5050
@@ -10,16 +15,15 @@ esp_addr = None
 esp_lock = threading.Lock()
 modo_error = False
 
+# Métricas que manda el canal ("METRICAS {json}" cada segundo, ver pam4/metricas.py)
+metricas_lock = threading.Lock()
+metricas_ant = None
+metricas_act = None
+ver_metricas = False  # True mientras se muestran en vivo (opción 6 del menú)
+
 # --- Función para decodificar PAM4 desde bytes (2 bits por símbolo) ---
 def decodificar_pam4(data_bytes):
-    simbolos = []
-    for b in data_bytes:
-        # Extraer 4 símbolos PAM4 de cada byte
-        simbolos.append((b >> 6) & 0b11)  # bits 7-6
-        simbolos.append((b >> 4) & 0b11)  # bits 5-4
-        simbolos.append((b >> 2) & 0b11)  # bits 3-2
-        simbolos.append(b & 0b11)         # bits 1-0
-    return simbolos
+    return codec.bytes_a_simbolos(data_bytes)  # 4 símbolos por byte (b7..b6 primero)
 
 # --- Hilo que acepta conexiones entrantes desde la ESP ---
 def esp_acceptor():
@@ -47,22 +51,28 @@ def esp_acceptor():
 # --- Hilo que recibe mensajes desde la ESP ---
 def esp_receiver(conn, addr):
     global modo_error
+    pend = b""
     try:
         while True:
             data = conn.recv(2048)
             if not data:
                 break
 
-            lines = data.split(b'\n')
+            lines = (pend + data).split(b'\n')
+            pend = lines.pop()  # la última puede estar incompleta: sigue en el próximo recv
             for line in lines:
                 if not line:
                     continue
 
+                if line.startswith(b'METRICAS '):
+                    recibir_metricas(line[len(b'METRICAS '):])
+                    continue
+
                 if line.startswith(b'CANAL (crudo):'):
                     payload = line[len(b'CANAL (crudo):'):].strip()
                     simbolos = decodificar_pam4(payload)
                     print("\n🛰️ --- MENSAJE DEL CANAL (PAM4 DECODIFICADO) ---")
-                    print(simbolos[:50], "..." if len(simbolos) > 50 else "")
+                    print(simbolos[:50].tolist(), "..." if len(simbolos) > 50 else "")
                     contar_pam4(simbolos)
                     continue
 
@@ -70,7 +80,7 @@ def esp_receiver(conn, addr):
                     payload = line[len(b'CANAL (modulado):'):].strip()
                     simbolos = decodificar_pam4(payload)
                     print("\n♻️ --- MENSAJE DEL CANAL (MODULADO PAM4) ---")
-                    print(simbolos[:50], "..." if len(simbolos) > 50 else "")
+                    print(simbolos[:50].tolist(), "..." if len(simbolos) > 50 else "")
                     contar_pam4(simbolos)
                     continue
 
@@ -96,12 +106,40 @@ def esp_receiver(conn, addr):
                 esp_addr = None
         print(f"[ADMIN] Conexión cerrada desde {addr[0]}")
 
+# --- Métricas del canal: tasas entre dos envíos ---
+def recibir_metricas(texto):
+    global metricas_ant, metricas_act
+    try:
+        nuevas = json.loads(texto)
+    except ValueError:
+        return
+    with metricas_lock:
+        metricas_ant, metricas_act = metricas_act, nuevas
+        ant, act = metricas_ant, metricas_act
+    if ver_metricas:
+        print(formatear_metricas(ant, act))
+
+def formatear_metricas(ant, act):
+    """Contadores (*_total) como tasa por segundo; el resto, el valor actual."""
+    dt = act["t"] - ant["t"] if ant else 0
+    lineas = [f"\n📊 Canal ({dt:.1f} s):" if dt else "\n📊 Canal:"]
+    for nombre, v in act.items():
+        if nombre == "t":
+            continue
+        corto = nombre.removeprefix("canal_")
+        if "_total" in nombre:
+            if dt > 0 and nombre in ant:
+                lineas.append(f"  {corto.replace('_total', '')}: {(v - ant[nombre]) / dt:,.0f}/s")
+        else:
+            lineas.append(f"  {corto}: {v}")
+    return "\n".join(lineas)
+
 # --- Función para contar símbolos PAM4 recibidos ---
 def contar_pam4(simbolos):
-    c = Counter(simbolos)
+    c = codec.contar_simbolos(simbolos)
     print("📊 Histograma PAM4:")
     for i in range(4):
-        print(f"  Nivel {i}: {c.get(i, 0)} símbolos")
+        print(f"  Nivel {i}: {c[i]} símbolos")
 
 # --- Función para enviar comandos o mensajes a la ESP ---
 def enviar_a_esp(msg):
@@ -116,9 +154,44 @@ def enviar_a_esp(msg):
             print("Error enviando a ESP:", e)
             return False
 
+# --- Configuración del modelo de error del canal (ver pam4/ruido.py) ---
+def configurar_errores():
+    print("Modelos: uniforme | gray | gilbert | awgn  (Enter = no cambiar)")
+    params = []
+    for clave, ayuda in (("modelo", "Modelo"),
+                         ("tasa", "Tasa de error (0..1)"),
+                         ("semilla", "Semilla (entero)"),
+                         ("p", "Gilbert: prob. bueno->malo"),
+                         ("r", "Gilbert: prob. malo->bueno"),
+                         ("sigma", "AWGN: desvío del ruido")):
+        valor = input(f"{ayuda}: ").strip()
+        if valor:
+            params.append(f"{clave}={valor}")
+    if not params:
+        print("Sin cambios.")
+        return
+    if enviar_a_esp("ERROR_CONFIG " + " ".join(params)):
+        print("[ADMIN] ⚙️ Configuración de errores enviada:", " ".join(params))
+
+# --- Alta / baja de suscriptores del fan-out del canal ---
+def gestionar_suscriptores():
+    print("Políticas: descartar_viejo | descartar_nuevo | desconectar")
+    nombre = input("Nombre del suscriptor: ").strip()
+    if not nombre:
+        return
+    destino = input("host:puerto (vacío = quitarlo): ").strip()
+    if not destino:
+        enviar_a_esp("DESUSCRIBIR " + nombre)
+        return
+    politica = input("Política (Enter = la del canal): ").strip()
+    max_cola = input("Cola máxima en lotes (Enter = la del canal): ").strip()
+    if max_cola and not politica:
+        politica = "descartar_viejo"
+    enviar_a_esp(" ".join(x for x in ("SUSCRIBIR", nombre, destino, politica, max_cola) if x))
+
 # --- Menú principal ---
 def main_menu():
-    global modo_error
+    global modo_error, ver_metricas
     while True:
         print("\n--- ADMINISTRADOR ---")
         with esp_lock:
@@ -128,7 +201,10 @@ def main_menu():
         print("1) Solicitar INFO de la ESP")
         print("2) Activar MODO ERROR (modificación PAM4)")
         print("3) Desactivar MODO ERROR")
-        print("4) Salir")
+        print("4) Configurar modelo de error (modelo, tasa, semilla)")
+        print("5) Agregar / quitar suscriptor del canal")
+        print("6) Ver métricas del canal en vivo")
+        print("7) Salir")
 
         op = input("Opción: ").strip()
         if op == "1":
@@ -142,6 +218,19 @@ def main_menu():
             enviar_a_esp("MODO_ERROR_OFF")
             print("[ADMIN] ❌ Modo error DESACTIVADO.")
         elif op == "4":
+            configurar_errores()
+        elif op == "5":
+            gestionar_suscriptores()
+        elif op == "6":
+            with metricas_lock:
+                act = metricas_act
+            if act is None:
+                print("Todavía no llegaron métricas del canal (las manda relay.py; la ESP32 no).")
+                continue
+            ver_metricas = True
+            input("(Enter para volver al menú)\n")
+            ver_metricas = False
+        elif op == "7":
             break
         else:
             print("Opción inválida.")
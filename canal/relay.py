@@ -0,0 +1,374 @@
+# relay.py - Canal PAM4 para CPython (asyncio), mismo protocolo que esp.py
+#
+# Reemplaza a la ESP32 cuando el canal tiene que correr en un servidor Linux:
+#   - cliente de control hacia la PC administradora (5050): MODO_ERROR_ON / MODO_ERROR_OFF
+#     y ERROR_CONFIG modelo=... tasa=... semilla=... (ver pam4/ruido.py)
+#   - servidor del canal (5051): atiende muchos transmisores a la vez, con conexiones
+#     largas. Cada conexión se detecta por sus primeros bytes: sobres del protocolo v2
+#     (pam4/sobre.py) o tramas crudas de 68 bytes (pam4/enmarcado.py); en los dos
+#     casos las tramas completas se procesan por lotes
+#   - todo sale en sobres v2: los del transmisor se reenvían con el payload alterado y
+#     su CRC original (así el receptor detecta los errores del canal); a las tramas
+#     crudas el canal les arma el sobre con el ID de la conexión y su propio seq.
+#     --sin-sobre reenvía solo los 68 bytes, como antes
+#   - fan-out pub/sub (difusion.py): receptor (5052), monitor (8100) y los que se
+#     agreguen con SUSCRIBIR o se conecten al puerto de suscripción; cada uno con su
+#     cola acotada y su tarea de envío, así un consumidor lento no frena a nadie
+#   - métricas (pam4/metricas.py): página de texto en "metricas" (127.0.0.1:9202) y
+#     una línea "METRICAS {json}" a la PC administradora cada "metricas_intervalo" s
+#
+# Configuración: valores por defecto de abajo, luego un archivo JSON (--config) y
+# por último las opciones de línea de comandos.
+#
+#   python relay.py --config canal.json --receptor 127.0.0.1:5052 --monitor 127.0.0.1:8100
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pam4 import codec
+from pam4.enmarcado import Enmarcador, FRAME_BYTES
+from pam4.ruido import InyectorErrores, parsear_config
+from pam4 import captura, metricas, registro, sobre
+from difusion import Difusor, POLITICAS
+
+CONFIG = {
+    "pc_admin": "10.0.1.66:5050",
+    "canal": "0.0.0.0:5051",
+    "receptor": "10.0.1.62:5052",
+    "monitor": "10.0.1.173:8100",
+    "modelo_error": "uniforme",  # uniforme | gray | gilbert | awgn
+    "prob_error": 0.05,
+    "semilla": None,             # entero para corridas reproducibles
+    "simbolos_protegidos": 16,   # prefijo "hola", nunca se altera
+    "suscriptores": {},          # nombre -> "host:puerto", además de receptor y monitor
+    "suscripcion": None,         # "host:puerto" para suscriptores entrantes (p. ej. "0.0.0.0:5053")
+    "max_cola": 64,              # lotes pendientes por suscriptor
+    "politica": "descartar_viejo",  # descartar_viejo | descartar_nuevo | desconectar
+    "sobre": True,               # False: salida en tramas crudas de 68 bytes (receptores viejos)
+    "log": "info",               # debug | info | warning | error (pam4/registro.py)
+    "traza": None,               # archivo de traza binaria por lote (None = sin traza)
+    "captura": None,             # archivo de captura de lo que sale del canal (pam4/captura.py)
+    "metricas": "127.0.0.1:9202",  # página de métricas (None = sin página)
+    "metricas_intervalo": 1.0,   # segundos entre envíos de métricas a la PC admin (0 = no enviar)
+}
+
+RECONEXION_ADMIN = 5
+MAX_PENDIENTE_ADMIN = 64 * 1024  # si la PC admin no lee, se descartan los avisos
+
+log = registro.obtener("canal")
+
+tramas_entrada = metricas.contador("canal_tramas_entrada_total", "Tramas recibidas de los transmisores")
+bytes_entrada = metricas.contador("canal_bytes_entrada_total", "Bytes recibidos de los transmisores")
+conexiones_admin = metricas.contador("canal_conexiones_admin_total", "Conexiones con la PC administradora")
+procesar_us = metricas.histograma("canal_procesar_us", "Tiempo de procesar un lote de tramas (µs)")
+
+
+def host_port(txt):
+    host, _, port = txt.rpartition(":")
+    return host, int(port)
+
+
+class Canal:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.modo_error = False
+        self.errores = InyectorErrores(cfg["modelo_error"], cfg["prob_error"], cfg["semilla"],
+                                       cfg["simbolos_protegidos"], FRAME_BYTES)
+        self.simbolos_alterados = 0
+        self.admin = None  # StreamWriter hacia la PC admin
+        self.difusor = Difusor(cfg["max_cola"], cfg["politica"])
+        self.paquetes = 0
+        # Fuentes: un ID por transmisor conectado; el mismo IP recupera su ID al reconectarse
+        self.ids_por_ip = {}
+        self.fuentes_activas = {}  # fuente -> (ip, puerto)
+        self.seq = {}              # fuente -> seq de la próxima trama (transmisores sin v2)
+        self.proxima_fuente = 1
+        self.traza = registro.TrazaBinaria(cfg["traza"]) if cfg["traza"] else None
+        self.grabador = captura.Grabador(cfg["captura"], "canal") if cfg["captura"] else None
+        self._medidores()
+
+    def _medidores(self):
+        # Se leen al publicar (desde el hilo de la página o la tarea de envío a la PC admin):
+        # estadísticas que el canal y el difusor ya llevan
+        subs = lambda campo: {n: s.estadisticas()[campo] for n, s in list(self.difusor.suscriptores.items())}
+        metricas.medidor("canal_transmisores", lambda: len(self.fuentes_activas), "Transmisores conectados")
+        metricas.medidor("canal_simbolos_alterados_total", lambda: self.simbolos_alterados,
+                         "Símbolos alterados por el modo error", tipo="counter")
+        metricas.medidor("canal_modo_error", lambda: int(self.modo_error), "1 si el modo error está activo")
+        for campo, ayuda, tipo in (
+                ("lag", "Lotes en la cola de cada suscriptor", "gauge"),
+                ("pendiente_bytes", "Bytes sin enviar en el socket de cada suscriptor", "gauge"),
+                ("enviados", "Lotes enviados a cada suscriptor", "counter"),
+                ("descartados", "Lotes descartados por cola llena", "counter"),
+                ("sin_conexion", "Lotes publicados con el suscriptor desconectado", "counter"),
+                ("desconexiones", "Desconexiones de cada suscriptor", "counter")):
+            nombre = "canal_suscriptor_" + campo + ("_total" if tipo == "counter" else "")
+            metricas.medidor(nombre, lambda c=campo: subs(c), ayuda, etiqueta="suscriptor", tipo=tipo)
+
+    def alta_fuente(self, addr):
+        libres = [f for f in self.ids_por_ip.get(addr[0], []) if f not in self.fuentes_activas]
+        if libres:
+            fuente = libres[0]
+        else:
+            fuente = self.proxima_fuente
+            self.proxima_fuente += 1
+            self.ids_por_ip.setdefault(addr[0], []).append(fuente)
+            self.seq[fuente] = 0
+        self.fuentes_activas[fuente] = addr
+        self.avisar_admin(f"INFO:TX{fuente} conectado desde {addr[0]}:{addr[1]}")
+        return fuente
+
+    def baja_fuente(self, fuente):
+        self.fuentes_activas.pop(fuente, None)
+
+    # --- Cliente con la PC administradora ---
+    async def control_admin(self):
+        host, port = host_port(self.cfg["pc_admin"])
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                self.admin = writer
+                conexiones_admin.sumar()
+                ip_local = writer.get_extra_info("sockname")[0]
+                log.info("🖥️ Conectado con la PC administradora %s:%s", host, port)
+                self.avisar_admin(f"INFO:ESP_IP={ip_local}")
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self.comando(line.decode(errors="ignore").strip())
+            except OSError as e:
+                log.warning("[❌] Error conexión con Admin: %s", e)
+            finally:
+                if self.admin:
+                    self.admin.close()
+                self.admin = None
+            await asyncio.sleep(RECONEXION_ADMIN)
+
+    def comando(self, cmd):
+        if cmd == "MODO_ERROR_ON":
+            self.modo_error = True
+            log.warning("[⚠️] Modo error ACTIVADO")
+        elif cmd == "MODO_ERROR_OFF":
+            self.modo_error = False
+            log.info("[✅] Modo error DESACTIVADO")
+        elif cmd.startswith("ERROR_CONFIG"):
+            try:
+                self.errores.configurar(**parsear_config(cmd[len("ERROR_CONFIG"):]))
+            except (TypeError, ValueError) as e:
+                self.avisar_admin(f"[ERROR] ERROR_CONFIG: {e}")
+                return
+            log.info("[⚙️] Errores: %s", self.errores)
+            self.avisar_admin(f"INFO:errores {self.errores}")
+        elif cmd.startswith("SUSCRIBIR"):
+            # SUSCRIBIR nombre host:puerto [politica] [max_cola]
+            partes = cmd.split()
+            try:
+                if not 3 <= len(partes) <= 5:
+                    raise ValueError("uso: SUSCRIBIR nombre host:puerto [politica] [max_cola]")
+                self.difusor.suscribir(partes[1], host_port(partes[2]),
+                                       int(partes[4]) if len(partes) > 4 else None,
+                                       partes[3] if len(partes) > 3 else None)
+            except ValueError as e:
+                self.avisar_admin(f"[ERROR] SUSCRIBIR: {e}")
+                return
+            self.avisar_admin(f"INFO:suscriptor {partes[1]} agregado")
+        elif cmd.startswith("DESUSCRIBIR"):
+            try:
+                self.difusor.desuscribir(cmd[len("DESUSCRIBIR"):].strip())
+            except ValueError as e:
+                self.avisar_admin(f"[ERROR] DESUSCRIBIR: {e}")
+                return
+            self.avisar_admin("INFO:suscriptor quitado")
+        elif cmd == "info":
+            self.avisar_admin(f"INFO:paquetes={self.paquetes} modo_error={self.modo_error} "
+                              f"alterados={self.simbolos_alterados} {self.errores}")
+            for fuente, addr in self.fuentes_activas.items():
+                self.avisar_admin(f"INFO:TX{fuente} {addr[0]}:{addr[1]} seq={self.seq[fuente]}")
+            for s in self.difusor.suscriptores.values():
+                self.avisar_admin(f"INFO:suscriptor {s}")
+
+    async def empujar_metricas(self):
+        # Por el mismo canal de control: pc_admin.py calcula las tasas entre dos envíos
+        if self.cfg["metricas_intervalo"] <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.cfg["metricas_intervalo"])
+            if self.admin:
+                self.avisar_admin("METRICAS " + metricas.instantanea_json())
+
+    def avisar_admin(self, txt):
+        w = self.admin
+        if w and w.transport.get_write_buffer_size() < MAX_PENDIENTE_ADMIN:
+            w.write((txt + "\n").encode())
+
+    # --- Servidor del canal ---
+    def procesar_lote(self, lote, fuente):
+        """k tramas crudas (k * 68 bytes) de un transmisor sin v2: el canal arma los sobres."""
+        s = sobre.armar(fuente, self.seq[fuente], lote, flags=sobre.FLAG_CANAL)
+        self.seq[fuente] = (self.seq[fuente] + len(s)) % sobre.SEQ_MOD
+        self.procesar_sobres(s, fuente)
+
+    def procesar_sobres(self, s, fuente):
+        """Procesa k sobres v2 de una vez (array SOBRE_DTYPE propio: se modifica en el lugar)."""
+        with procesar_us.medir():
+            self._procesar_sobres(s, fuente)
+        tramas_entrada.sumar(len(s))
+
+    def _procesar_sobres(self, s, fuente):
+        s["stream"][s["stream"] == 0] = fuente
+        if self.modo_error:
+            simbolos, k = self.errores.aplicar(codec.bytes_a_simbolos(s["payload"]))
+            s["payload"] = codec.simbolos_a_array(simbolos).reshape(-1, FRAME_BYTES)
+            self.simbolos_alterados += k
+            if self.traza:
+                self.traza.registrar(registro.EV_ERRORES, fuente, len(s), k)
+        if log.isEnabledFor(registro.DEBUG):
+            log.debug("[TX] TX%d: lote de %d tramas, seq %d..%d", fuente, len(s),
+                      s["seq"][0], s["seq"][-1])
+        if self.grabador:
+            self.grabador.grabar(s)  # ya con los errores del canal, como lo ven receptor y monitor
+        # El CRC no se recalcula: los símbolos alterados llegan al receptor como CRC inválido
+        self.difusor.publicar(s.tobytes() if self.cfg["sobre"] else s["payload"].tobytes())
+        self.paquetes += len(s)  # el admin lo ve con INFO o en el empuje de METRICAS, no por lote
+
+    async def run(self):
+        host, port = host_port(self.cfg["canal"])
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: ProtocoloTX(self), host, port)
+        log.info("[📡] Esperando transmisores en puerto %s...", port)
+        admin = asyncio.create_task(self.control_admin())
+        empujador = asyncio.create_task(self.empujar_metricas())
+        if self.cfg["metricas"]:
+            h, p = host_port(self.cfg["metricas"])
+            metricas.servir(p, h)
+        salidas = dict(self.cfg["suscriptores"])
+        for nombre in ("receptor", "monitor"):
+            if self.cfg[nombre]:
+                salidas[nombre] = self.cfg[nombre]
+        for nombre, destino in salidas.items():
+            self.difusor.suscribir(nombre, host_port(destino))
+        if self.cfg["suscripcion"]:
+            h, p = host_port(self.cfg["suscripcion"])
+            await self.difusor.servir(h, p)
+            log.info("[📡] Suscriptores entrantes en puerto %s", p)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            admin.cancel()
+            empujador.cancel()
+            self.difusor.cerrar()
+            if self.traza:
+                self.traza.cerrar()
+            if self.grabador:
+                self.grabador.cerrar()
+
+
+class ProtocoloTX(asyncio.BufferedProtocol):
+    """Conexión larga con un transmisor: se recibe directo en el buffer del Enmarcador."""
+
+    def __init__(self, canal):
+        self.canal = canal
+        self.lector = None  # Enmarcador (tramas crudas) o LectorSobres (v2), según los primeros bytes
+        self.inicio = bytearray(3)
+        self.n_inicio = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.addr = transport.get_extra_info("peername")
+        self.fuente = self.canal.alta_fuente(self.addr)
+        log.info("[TX] Conexión desde %s -> TX%d", self.addr, self.fuente)
+
+    def get_buffer(self, sizehint):
+        if self.lector is None:
+            return memoryview(self.inicio)[self.n_inicio:]
+        return self.lector.espacio()
+
+    def buffer_updated(self, nbytes):
+        bytes_entrada.sumar(nbytes)
+        if self.lector is None:
+            self.n_inicio += nbytes
+            if self.n_inicio < len(self.inicio):
+                return
+            if sobre.es_sobre(self.inicio):
+                self.lector = sobre.LectorSobres()
+            else:
+                self.lector = Enmarcador(FRAME_BYTES)
+                log.info("[TX] TX%d manda tramas crudas de 68 bytes (sin protocolo v2)", self.fuente)
+            libre = self.lector.espacio()
+            libre[:len(self.inicio)] = self.inicio
+            nbytes = len(self.inicio)
+        # publicar() no bloquea: un suscriptor lento no frena a los transmisores
+        if isinstance(self.lector, Enmarcador):
+            lote = self.lector.avanzar(nbytes)
+            if lote:
+                self.canal.procesar_lote(lote, self.fuente)
+        else:
+            s, _ = self.lector.avanzar(nbytes)
+            if len(s):
+                self.canal.procesar_sobres(s.copy(), self.fuente)
+
+    def connection_lost(self, exc):
+        if exc:
+            log.error("[Error canal interno]: %s", exc)
+        self.canal.baja_fuente(self.fuente)
+        log.info("[TX] Desconectado %s (TX%d)", self.addr, self.fuente)
+        if isinstance(self.lector, sobre.LectorSobres) and (self.lector.crc_malos or self.lector.bytes_descartados):
+            log.warning("[TX] TX%d: %d sobres con CRC inválido, %d bytes descartados al resincronizar",
+                        self.fuente, self.lector.crc_malos, self.lector.bytes_descartados)
+
+
+def cargar_config(argv=None):
+    ap = argparse.ArgumentParser(description="Canal PAM4 (relay CPython)")
+    ap.add_argument("--config", help="archivo JSON con las mismas claves que CONFIG")
+    ap.add_argument("--pc-admin", help="host:puerto de la PC administradora")
+    ap.add_argument("--canal", help="host:puerto donde escuchar a los transmisores")
+    ap.add_argument("--receptor", help="host:puerto del receptor")
+    ap.add_argument("--monitor", help="host:puerto del monitor")
+    ap.add_argument("--modelo-error", choices=("uniforme", "gray", "gilbert", "awgn"))
+    ap.add_argument("--prob-error", type=float)
+    ap.add_argument("--semilla", type=int)
+    ap.add_argument("--suscripcion", help="host:puerto para suscriptores entrantes")
+    ap.add_argument("--max-cola", type=int, help="lotes pendientes por suscriptor")
+    ap.add_argument("--politica", choices=POLITICAS, help="qué hacer si la cola de un suscriptor se llena")
+    ap.add_argument("--sin-sobre", dest="sobre", action="store_const", const=False, default=None,
+                    help="reenviar tramas crudas de 68 bytes (modo legacy, sin protocolo v2)")
+    ap.add_argument("--log", choices=registro.NIVELES, help="nivel de log (debug muestra cada lote)")
+    ap.add_argument("--traza", metavar="ARCHIVO", help="traza binaria de eventos (pam4/registro.py)")
+    ap.add_argument("--captura", metavar="ARCHIVO",
+                    help="grabar las tramas que salen del canal (pam4/captura.py)")
+    ap.add_argument("--metricas", help="host:puerto de la página de métricas ('' = sin página)")
+    args = ap.parse_args(argv)
+
+    cfg = dict(CONFIG)
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            cfg.update(json.load(f))
+    for k in ("pc_admin", "canal", "receptor", "monitor", "modelo_error", "prob_error", "semilla",
+              "suscripcion", "max_cola", "politica", "sobre", "log", "traza",
+              "captura", "metricas"):
+        v = getattr(args, k)
+        if v is not None:
+            cfg[k] = v
+    return cfg
+
+
+def main(argv=None):
+    cfg = cargar_config(argv)
+    registro.configurar(cfg["log"])
+    try:
+        asyncio.run(Canal(cfg).run())
+    except KeyboardInterrupt:
+        log.info("Canal detenido.")
+    finally:
+        registro.cerrar()
+
+
+if __name__ == "__main__":
+    main()
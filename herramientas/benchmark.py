@@ -0,0 +1,372 @@
+# benchmark.py - Mediciones de rendimiento de la cadena PAM4 (tramas/s, símbolos/s, latencia)
+#
+# Dos partes:
+#   1. Micro: cada etapa por separado, con las mismas funciones que usan los scripts
+#      (modulación del transmisor, decodificaciones del receptor, pc_admin y monitor,
+#      búsqueda de cabecera, reconstrucción, y el lazo de corte de cada receptor).
+#      símbolos/s = tramas/s * 272.
+#   2. Punta a punta en localhost: generador (Transmisor/generador.py) -> canal relay.py
+#      -> receptor PC -> recepción del monitor (Ingesta de Monitor/analisis.py, la que
+#      corre en el ServerThread, sin ventanas). Se mide la latencia de cada trama desde
+#      el timestamp del sobre hasta que el monitor la demultiplexa.
+#
+# Los resultados van a un JSON (--salida). Con --base se comparan contra un JSON
+# anterior y se marca como regresión una caída de tramas/s (o un aumento del p99)
+# mayor que --tolerancia; en ese caso el script sale con código 1.
+#
+#   python benchmark.py --salida base.json
+#   python benchmark.py --base base.json --salida hoy.json
+#   python benchmark.py --solo receptor --sin-e2e
+#
+# Sin PyQt6 / pyqtgraph se omiten las funciones del monitor; el punta a punta no los
+# necesita.
+
+import argparse
+import ast
+import importlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+from pam4 import codec, registro, sobre
+from pam4.reconstruccion import Reconstructor
+
+FRAME_BYTES = sobre.FRAME_BYTES
+SIMBOLOS = 4 * FRAME_BYTES  # 272 por trama
+LOTE = 256                  # tramas por llamada en las etapas que procesan por lote
+RECV = 4096                 # bytes por recv en los lazos de corte (el buffer de la ESP32)
+CALENTAMIENTO = 0.5         # s: no se mide la latencia de las primeras tramas (conexiones)
+DRENAJE = 1.0               # s: espera al final para que lleguen las tramas en vuelo
+
+log = registro.obtener("benchmark")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Benchmarks de la cadena PAM4")
+    ap.add_argument("--segundos", type=float, default=1.0, help="duración de cada micro benchmark")
+    ap.add_argument("--solo", help="solo los benchmarks cuyo nombre contiene este texto")
+    ap.add_argument("--sin-e2e", action="store_true", help="no correr el punta a punta")
+    ap.add_argument("--e2e-segundos", type=float, default=5.0)
+    ap.add_argument("--e2e-tx", type=int, default=2, help="transmisores simulados")
+    ap.add_argument("--e2e-fps", type=float, default=500, help="tramas/s de cada transmisor")
+    ap.add_argument("--salida", help="archivo JSON de resultados")
+    ap.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    ap.add_argument("--tolerancia", type=float, default=0.10,
+                    help="variación admitida antes de marcar regresión (default %(default)s)")
+    ap.add_argument("--log", default="info", choices=registro.NIVELES)
+    return ap.parse_args()
+
+
+# --- Datos de prueba ---
+def tramas_azar(k, rng):
+    t = rng.integers(0, 256, (k, FRAME_BYTES), dtype=np.uint8)
+    t[:, :4] = np.frombuffer(b"hola", np.uint8)
+    return t
+
+
+class ConexionMemoria:
+    """Hace de socket: cada recv_into entrega hasta RECV bytes de un stream cíclico."""
+
+    def __init__(self, datos, por_recv=RECV):
+        self.datos = memoryview(datos)
+        self.por_recv = por_recv
+        self.pos = 0
+
+    def recv_into(self, mv):
+        k = min(len(mv), self.por_recv, len(self.datos) - self.pos)
+        mv[:k] = self.datos[self.pos:self.pos + k]
+        self.pos = (self.pos + k) % len(self.datos)
+        return k
+
+
+# --- Carga de los scripts de cada componente ---
+def importar(carpeta, modulo):
+    ruta = os.path.join(RAIZ, carpeta)
+    if ruta not in sys.path:
+        sys.path.insert(0, ruta)
+    return importlib.import_module(modulo)
+
+
+def importar_monitor():
+    """Monitor/Monitor (sin extensión) como módulo; ImportError sin PyQt6 / pyqtgraph."""
+    ruta = os.path.join(RAIZ, "Monitor", "Monitor")
+    cargador = importlib.machinery.SourceFileLoader("monitor", ruta)
+    mod = importlib.util.module_from_spec(importlib.util.spec_from_loader("monitor", cargador))
+    cargador.exec_module(mod)
+    return mod
+
+
+def funciones_esp32():
+    """cortar_bloque y las constantes de receptor/main.py, sin ejecutar el resto del
+    archivo (importa network y usocket, que solo existen en la placa)."""
+    ruta = os.path.join(RAIZ, "receptor", "main.py")
+    with open(ruta, encoding="utf-8") as f:
+        arbol = ast.parse(f.read(), ruta)
+    nodos = [n for n in arbol.body
+             if isinstance(n, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in n.targets)
+             or isinstance(n, ast.FunctionDef) and n.name == "cortar_bloque"]
+    ns = {}
+    exec(compile(ast.Module(nodos, []), ruta, "exec"), ns)
+    return ns
+
+
+# --- Micro benchmarks: cada uno devuelve una función sin argumentos -> tramas procesadas ---
+def micro_benchmarks(rng):
+    """nombre -> función, u (nombre, motivo) si no se puede correr acá."""
+    t = tramas_azar(LOTE, rng)
+    una = t[0].tobytes()
+    lote = t.tobytes()
+    simbolos = codec.bytes_a_simbolos(lote)
+    bins = [int(x) for x in t[0, 4:]]
+    rec = Reconstructor(ventana=0.01)
+    benchs, omitidos = {}, {}
+
+    tx = importar("Transmisor", "PF_transmisor_pam4_serial_hola_1")
+    benchs["transmisor.mod_pam4_desde_bytes"] = lambda: tx.mod_pam4_desde_bytes(una) and 1
+
+    rx = importar("receptor", "codigo_pc_receptora")
+    benchs["receptor.decodificar_pam4"] = lambda: len(rx.decodificar_pam4(t)) // SIMBOLOS
+    admin = importar("canal", "pc_admin")
+    benchs["canal.pc_admin.decodificar_pam4"] = lambda: admin.decodificar_pam4(una) is not None
+
+    try:
+        mon = importar_monitor()
+    except ImportError as e:
+        for n in ("unpack_bytes_to_symbols", "decode_256_symbols_to_64_8bit", "find_latest_valid_frame"):
+            omitidos["monitor." + n] = f"sin {e.name}"
+    else:
+        ventana = simbolos[:mon.BUFFER_SYMBOLS]
+        benchs["monitor.unpack_bytes_to_symbols"] = lambda: len(mon.unpack_bytes_to_symbols(lote)) // SIMBOLOS
+        benchs["monitor.decode_256_symbols_to_64_8bit"] = \
+            lambda: bool(mon.decode_256_symbols_to_64_8bit(simbolos[16:272]))
+        benchs["monitor.find_latest_valid_frame"] = lambda: mon.find_latest_valid_frame(ventana)[1] >= 0
+
+    benchs["reconstruccion.senal"] = lambda: rec.senal(bins) is not None
+    benchs["reconstruccion.lote"] = lambda: len(rec.lote(t[:, 4:]))
+
+    # Lazo de corte de la ESP32 receptora: igual que main(), sin el reenvío
+    esp = funciones_esp32()
+    cortar = esp["cortar_bloque"]
+    buf = bytearray(esp["BUF_BYTES"])
+    mv = memoryview(buf)
+    conn_esp = ConexionMemoria(sobre.ensobrar(1, 0, lote))
+    estado = {"n": 0}
+
+    def lazo_esp32():
+        n = estado["n"]
+        n += conn_esp.recv_into(mv[n:])
+        i = bloques = 0
+        while True:
+            k = cortar(buf, i, n)
+            if k <= 0:
+                break
+            i += k
+            bloques += 1
+        if i:
+            resto = n - i
+            if resto:
+                mv[:resto] = mv[i:n]
+            n = resto
+        estado["n"] = n
+        return bloques
+    benchs["receptor.esp32.cortar_bloque"] = lazo_esp32
+
+    # Lazo de recepción del receptor PC: ConexionESP.recibir (recv_into + LectorSobres + etiquetas)
+    conn_pc = rx.ConexionESP(ConexionMemoria(sobre.ensobrar(1, 0, lote)), ("benchmark", 0), rx.Etiquetas())
+
+    def lazo_pc():
+        lote_pc = conn_pc.recibir()
+        return len(lote_pc[0]) if lote_pc else 0
+    benchs["receptor.pc.recibir"] = lazo_pc
+
+    return benchs, omitidos
+
+
+def medir(funcion, segundos):
+    funcion()  # calentar (cachés, primeras asignaciones)
+    tramas = llamadas = 0
+    inicio = time.perf_counter()
+    fin = inicio + segundos
+    while True:
+        tramas += funcion()
+        llamadas += 1
+        ahora = time.perf_counter()
+        if ahora >= fin:
+            break
+    dt = ahora - inicio
+    return {"tramas_s": tramas / dt, "simbolos_s": tramas * SIMBOLOS / dt,
+            "us_por_llamada": dt / llamadas * 1e6}
+
+
+# --- Punta a punta ---
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_puerto(port, timeout=10.0):
+    fin = time.monotonic() + timeout
+    while time.monotonic() < fin:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nadie escucha en el puerto {port}")
+
+
+def e2e(segundos, n_tx, fps):
+    """generador -> relay.py -> receptor PC -> monitor, todo en esta máquina."""
+    p_canal, p_rx, p_mon = puerto_libre(), puerto_libre(), puerto_libre()
+    muestras = []  # por lote: arrays de stream, seq, timestamp y latencia (µs)
+
+    def al_demux(s):
+        ts = s["timestamp"].astype(np.int64)
+        muestras.append((s["stream"].copy(), s["seq"].copy(), ts, sobre.timestamp_us() - ts))
+
+    class MonitorMedido(importar("Monitor", "analisis").Ingesta):
+        def demux(self, s, ok, ip):
+            al_demux(s)
+            super().demux(s, ok, ip)
+
+    destino = MonitorMedido(p_mon)
+    hilo_monitor = threading.Thread(target=destino.run, daemon=True)
+    hilo_monitor.start()
+
+    silencio = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    receptor = subprocess.Popen(
+        [sys.executable, "-c",
+         "import codigo_pc_receptora as rx; "
+         f"rx.HOST = '127.0.0.1'; rx.PORT = {p_rx}; rx.VIS_IP = '127.0.0.1'; rx.VIS_PORT = {p_mon}; "
+         "rx.NIVEL_LOG = 'error'; rx.main()"],
+        cwd=os.path.join(RAIZ, "receptor"), **silencio)
+    canal = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "canal", "relay.py"), "--canal", f"127.0.0.1:{p_canal}",
+         "--receptor", f"127.0.0.1:{p_rx}", "--monitor", "", "--pc-admin", f"127.0.0.1:{puerto_libre()}",
+         "--log", "error"], **silencio)
+    try:
+        esperar_puerto(p_mon)
+        esperar_puerto(p_rx)
+        esperar_puerto(p_canal)
+        inicio = sobre.timestamp_us()
+        gen = subprocess.run(
+            [sys.executable, os.path.join(RAIZ, "Transmisor", "generador.py"),
+             "--destino", f"127.0.0.1:{p_canal}", "--tx", str(n_tx), "--fps", str(fps),
+             "--duracion", str(segundos), "--log", "warning"],
+            capture_output=True, text=True)
+        if gen.returncode:
+            raise RuntimeError(f"el generador falló: {gen.stderr.strip()}")
+        time.sleep(DRENAJE)
+    finally:
+        for p in (canal, receptor):
+            p.terminate()
+            p.wait(5)
+        destino.stop()
+        hilo_monitor.join(3)
+
+    if not muestras:
+        raise RuntimeError("no llegó ninguna trama al monitor")
+    streams, seqs, ts, lat = (np.concatenate(c) for c in zip(*muestras))
+    # Las primeras tramas esperan a que se armen las conexiones: no cuentan para la latencia
+    medidas = lat[ts >= inicio + CALENTAMIENTO * 1e6]
+    if not medidas.size:
+        medidas = lat
+    enviadas = sum(int(seqs[streams == st].max()) + 1 for st in np.unique(streams))
+    p50, p99 = np.percentile(medidas, [50, 99]) / 1000
+    return {"monitor": "Ingesta", "tx": n_tx, "fps_por_tx": fps, "segundos": segundos,
+            "enviadas": enviadas, "recibidas": len(lat), "perdidas": enviadas - len(lat),
+            "tramas_s": len(lat) / segundos,
+            "latencia_ms": {"p50": float(p50), "p99": float(p99), "max": float(medidas.max() / 1000)}}
+
+
+# --- Comparación con la base ---
+def comparar(actual, base, tolerancia):
+    """-> lista de (nombre, valor, valor_base, cambio relativo, regresión)."""
+    filas = []
+    for nombre, r in actual["micro"].items():
+        b = base.get("micro", {}).get(nombre)
+        if b:
+            cambio = r["tramas_s"] / b["tramas_s"] - 1
+            filas.append((nombre + " tramas/s", r["tramas_s"], b["tramas_s"], cambio, cambio < -tolerancia))
+    a, b = actual.get("e2e"), base.get("e2e")
+    if a and b and a["monitor"] == b["monitor"]:  # bases de antes (ServerThread / sumidero) no se comparan
+        cambio = a["tramas_s"] / b["tramas_s"] - 1
+        filas.append(("e2e tramas/s", a["tramas_s"], b["tramas_s"], cambio, cambio < -tolerancia))
+        for p in ("p50", "p99"):
+            cambio = a["latencia_ms"][p] / b["latencia_ms"][p] - 1
+            filas.append((f"e2e latencia {p} ms", a["latencia_ms"][p], b["latencia_ms"][p], cambio,
+                          cambio > tolerancia))
+    return filas
+
+
+def main():
+    args = parse_args()
+    registro.configurar(args.log)
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "maquina": {"plataforma": platform.platform(), "python": platform.python_version(),
+                    "numpy": np.__version__, "cpus": os.cpu_count()},
+        "micro": {},
+        "omitidos": {},
+    }
+    codigo = 0
+    try:
+        benchs, omitidos = micro_benchmarks(np.random.default_rng(0))
+        for nombre, motivo in omitidos.items():
+            if not args.solo or args.solo in nombre:
+                resultados["omitidos"][nombre] = motivo
+                log.warning("⚠ %s omitido (%s)", nombre, motivo)
+        for nombre, funcion in benchs.items():
+            if args.solo and args.solo not in nombre:
+                continue
+            r = resultados["micro"][nombre] = medir(funcion, args.segundos)
+            log.info("%-40s %12.0f tramas/s %14.0f símbolos/s %10.2f µs/llamada",
+                     nombre, r["tramas_s"], r["simbolos_s"], r["us_por_llamada"])
+
+        if not args.sin_e2e:
+            log.info("Punta a punta: %d TX a %s tramas/s durante %s s...", args.e2e_tx, args.e2e_fps,
+                     args.e2e_segundos)
+            r = resultados["e2e"] = e2e(args.e2e_segundos, args.e2e_tx, args.e2e_fps)
+            log.info("e2e (%s): %d/%d tramas, %.0f tramas/s, latencia p50 %.2f ms, p99 %.2f ms, máx %.2f ms",
+                     r["monitor"], r["recibidas"], r["enviadas"], r["tramas_s"],
+                     r["latencia_ms"]["p50"], r["latencia_ms"]["p99"], r["latencia_ms"]["max"])
+
+        if args.salida:
+            with open(args.salida, "w", encoding="utf-8") as f:
+                json.dump(resultados, f, indent=2, ensure_ascii=False)
+            log.info("Resultados en %s", args.salida)
+
+        if args.base:
+            with open(args.base, encoding="utf-8") as f:
+                base = json.load(f)
+            regresiones = 0
+            for nombre, valor, valor_base, cambio, regresion in comparar(resultados, base, args.tolerancia):
+                regresiones += regresion
+                (log.warning if regresion else log.info)(
+                    "%s %-40s %12.2f (base %12.2f, %+6.1f%%)", "⚠" if regresion else " ", nombre,
+                    valor, valor_base, 100 * cambio)
+            if regresiones:
+                log.warning("⚠ %d regresiones respecto de %s (tolerancia %.0f%%)", regresiones,
+                            args.base, 100 * args.tolerancia)
+                codigo = 1
+    except KeyboardInterrupt:
+        log.info("Benchmark interrumpido.")
+    finally:
+        registro.cerrar()
+    sys.exit(codigo)
+
+
+if __name__ == "__main__":
+    main()
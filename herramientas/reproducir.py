@@ -0,0 +1,154 @@
+# reproducir.py - Reproduce una captura (pam4/captura.py) contra el canal, el receptor o el monitor
+#
+# Se conecta por TCP al destino y le manda los sobres grabados:
+#   canal      5051  (como un transmisor v2, o --crudo como uno legacy)
+#   receptor   9100  (como la ESP32 receptora)
+#   monitor    8100  (como el canal)
+#
+# Temporización:
+#   --velocidad 1   respeta los tiempos originales de la captura (por defecto)
+#   --velocidad 4   4 veces más rápido (0.5 = la mitad)
+#   --velocidad 0   lo más rápido posible, en lotes de --lote sobres
+#
+# Los registros se leen con np.memmap: una captura grande no se carga en memoria y
+# --desde / --hasta van directo al tramo pedido.
+#
+# Una captura a la que se le agregaron registros después (o grabada desde varios
+# hilos) puede tener el tiempo yendo para atrás: en ese caso se avisa y se reproduce
+# (y se informa) en orden de tiempo, con un orden estable por "t".
+#
+#   python reproducir.py canal.p4cap --a monitor
+#   python reproducir.py canal.p4cap --destino 10.0.1.173:8100 --velocidad 0 --repetir 10
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pam4 import captura, registro
+
+PUERTOS = {"canal": 5051, "receptor": 9100, "monitor": 8100}
+LOTE = 256
+TOLERANCIA = 0.001  # s: se manda junto todo lo que vence dentro de este margen
+
+log = registro.obtener("reproducir")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Reproduce una captura PAM4 por TCP")
+    ap.add_argument("archivo", help="captura (pam4/captura.py)")
+    ap.add_argument("--a", dest="hacia", choices=PUERTOS, default="monitor",
+                    help="a qué componente (puerto por defecto, default %(default)s)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--destino", help="host:puerto (en lugar de --a/--host)")
+    ap.add_argument("--velocidad", type=float, default=1.0,
+                    help="1 = tiempos originales, >1 más rápido, 0 = lo más rápido posible")
+    ap.add_argument("--lote", type=int, default=LOTE, help="sobres por envío con --velocidad 0")
+    ap.add_argument("--desde", type=int, default=0, help="primer registro")
+    ap.add_argument("--hasta", type=int, help="último registro (exclusivo)")
+    ap.add_argument("--repetir", type=int, default=1, help="veces que se reproduce la captura")
+    ap.add_argument("--crudo", action="store_true",
+                    help="mandar solo los 68 bytes de cada trama (receptores / transmisores legacy)")
+    ap.add_argument("--info", action="store_true", help="solo mostrar el contenido de la captura")
+    ap.add_argument("--log", default="info", choices=registro.NIVELES)
+    return ap.parse_args()
+
+
+def orden_temporal(regs):
+    """None si los tiempos nunca bajan; si no, el orden (estable) de los registros por "t"."""
+    t = regs["t"]
+    if np.all(t[1:] >= t[:-1]):
+        return None
+    log.warning("⚠ la captura tiene tiempos fuera de orden: se reproduce ordenada por tiempo")
+    return np.argsort(t, kind="stable")
+
+
+def bloque(regs, i, j, crudo, orden=None):
+    """Registros [i, j) (del orden temporal, si se da) -> bytes para el cable."""
+    s = regs["sobre"][i:j] if orden is None else regs["sobre"][orden[i:j]]
+    return s["payload"].tobytes() if crudo else s.tobytes()
+
+
+def info(cab, regs, orden=None):
+    log.info("Captura de %s, creada %s, %d registros", cab["punto"],
+             time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cab["t0"] / 1e6)), len(regs))
+    if not len(regs):
+        return
+    t = regs["t"] if orden is None else regs["t"][orden]
+    dur = (int(t[-1]) - int(t[0])) / 1e6
+    log.info("Duración %.3f s (%.1f tramas/s)", dur, len(regs) / dur if dur else float("inf"))
+    streams, cuenta = np.unique(regs["sobre"]["stream"], return_counts=True)
+    for st, n in zip(streams, cuenta):
+        log.info("  TX%d: %d tramas", st, n)
+
+
+def reproducir(sock, regs, velocidad, lote, crudo, orden=None):
+    """Una pasada por regs (en el orden dado) -> bytes enviados."""
+    n = len(regs)
+    enviados = 0
+    if velocidad <= 0:
+        for i in range(0, n, lote):
+            datos = bloque(regs, i, min(i + lote, n), crudo, orden)
+            sock.sendall(datos)
+            enviados += len(datos)
+        return enviados
+
+    # Tiempo de cada registro relativo al primero, ya escalado
+    t = (regs["t"] if orden is None else regs["t"][orden]).astype(np.int64)
+    rel = (t - t[0]) / (1e6 * velocidad)
+    inicio = time.perf_counter()
+    i = 0
+    while i < n:
+        ahora = time.perf_counter() - inicio
+        if rel[i] > ahora:
+            time.sleep(rel[i] - ahora)
+            ahora = time.perf_counter() - inicio
+        j = int(np.searchsorted(rel, ahora + TOLERANCIA, side="right"))
+        datos = bloque(regs, i, j, crudo, orden)
+        sock.sendall(datos)
+        enviados += len(datos)
+        i = j
+    return enviados
+
+
+def main():
+    args = parse_args()
+    registro.configurar(args.log)
+    try:
+        cab, regs = captura.abrir(args.archivo)
+        regs = regs[args.desde:args.hasta]
+        orden = orden_temporal(regs) if len(regs) else None
+        info(cab, regs, orden)
+        if args.info or not len(regs):
+            return
+
+        if args.destino:
+            host, _, port = args.destino.rpartition(":")
+        else:
+            host, port = args.host, PUERTOS[args.hacia]
+        sock = socket.create_connection((host, int(port)))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        log.info("Reproduciendo %d registros hacia %s:%s (velocidad %s)", len(regs), host, port,
+                 args.velocidad or "máxima")
+
+        total = 0
+        t0 = time.perf_counter()
+        with sock:
+            for _ in range(args.repetir):
+                total += reproducir(sock, regs, args.velocidad, max(1, args.lote), args.crudo, orden)
+        dt = time.perf_counter() - t0
+        tramas = len(regs) * args.repetir
+        log.info("Enviadas %d tramas (%d bytes) en %.3f s: %.0f tramas/s, %.2f MB/s",
+                 tramas, total, dt, tramas / dt if dt else 0, total / dt / 1e6 if dt else 0)
+    except KeyboardInterrupt:
+        log.info("Reproducción interrumpida.")
+    finally:
+        registro.cerrar()
+
+
+if __name__ == "__main__":
+    main()
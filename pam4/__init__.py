@@ -0,0 +1,18 @@
+# pam4 - Módulos compartidos de la cadena PAM4 (transmisor, canal, receptor, monitor)
+#
+# Los scripts de cada carpeta agregan la raíz del repo al sys.path para importarlo.
+# En la ESP32 se copia esta carpeta a la memoria de la placa.
+#
+# Acá solo se re-exporta el codec (corre también en MicroPython); el resto de los
+# módulos usa NumPy/CPython y se importa por nombre, p. ej. `from pam4.anillo import ...`.
+
+from .codec import (
+    BINS_POR_TRAMA,
+    SIMBOLOS_POR_BYTE,
+    TABLA_SIMBOLOS,
+    bytes_a_simbolos,
+    contar_simbolos,
+    simbolos_a_array,
+    simbolos_a_bins,
+    simbolos_a_bytes,
+)
@@ -0,0 +1,62 @@
+# anillo.py - Buffer circular de símbolos PAM4 (uint8) con cursor de escritura monótono
+#
+# El buffer está "espejado": cada símbolo se guarda en i y en i + capacidad, así
+# cualquier ventana de hasta `capacidad` símbolos es contigua y se puede leer
+# como vista de NumPy sin copiar.
+#
+# Un solo hilo escribe (el handler de red); los lectores guardan su propio cursor
+# y piden lo nuevo con desde(). El cursor se actualiza después de copiar los datos.
+
+import numpy as np
+
+
+class AnilloSimbolos:
+    def __init__(self, capacidad=10000):
+        self.capacidad = int(capacidad)
+        self._buf = np.zeros(2 * self.capacidad, dtype=np.uint8)
+        self.escrito = 0  # total de símbolos escritos desde el inicio
+
+    def _copiar(self, pos, datos):
+        C = self.capacidad
+        a = pos % C
+        n1 = min(len(datos), C - a)
+        self._buf[a:a + n1] = datos[:n1]
+        self._buf[a + C:a + C + n1] = datos[:n1]
+        if n1 < len(datos):
+            n2 = len(datos) - n1
+            self._buf[:n2] = datos[n1:]
+            self._buf[C:C + n2] = datos[n1:]
+
+    def escribir(self, simbolos):
+        """Agrega símbolos al anillo y devuelve la cantidad escrita."""
+        s = np.asarray(simbolos, dtype=np.uint8)
+        n = s.size
+        if n == 0:
+            return 0
+        # Si llegan más símbolos que la capacidad solo sobreviven los últimos
+        m = min(n, self.capacidad)
+        self._copiar(self.escrito + n - m, s[n - m:])
+        self.escrito += n
+        return n
+
+    def ventana(self, ini, fin):
+        """Vista (sin copia) de las posiciones absolutas [ini, fin)."""
+        ini = max(ini, fin - self.capacidad, 0)
+        a = ini % self.capacidad
+        return self._buf[a:a + (fin - ini)]
+
+    def ultimos(self, n):
+        """Vista de los últimos n símbolos (o menos si todavía no hay tantos)."""
+        fin = self.escrito
+        return self.ventana(fin - min(n, fin), fin)
+
+    def desde(self, pos):
+        """Símbolos nuevos desde la posición `pos` -> (vista, nueva_pos).
+
+        Si el lector se atrasó más de `capacidad`, lo perdido se saltea.
+        """
+        fin = self.escrito
+        return self.ventana(pos, fin), fin
+
+    def __len__(self):
+        return min(self.escrito, self.capacidad)
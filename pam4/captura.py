@@ -0,0 +1,99 @@
+# captura.py - Archivo de captura del stream PAM4 (grabar y reproducir)
+#
+# Formato (todo big-endian, como el sobre):
+#
+#   cabecera fija de 32 bytes
+#     0..3    magic          b"P4CP"
+#     4..5    versión        1
+#     6..7    registro       bytes por registro (100)
+#     8       punto          dónde se grabó: 1 transmisor, 2 canal, 3 receptor
+#     9       reservado
+#     10..11  payload        bytes de trama (68)
+#     12..19  t0             µs desde epoch al crear el archivo
+#     20..31  reservado
+#   registros de 100 bytes, uno por trama
+#     0..7    t              µs desde epoch en que pasó por el punto de captura
+#     8..99   sobre          el sobre v2 completo (pam4/sobre.py, 92 bytes)
+#
+# Se guarda siempre el sobre v2: si el punto de captura ve tramas crudas de 68 bytes,
+# Grabador les arma el sobre. La cantidad de registros sale del tamaño del archivo
+# (no hay que reescribir la cabecera, y una captura cortada se lee hasta el último
+# registro completo).
+#
+# abrir() devuelve un np.memmap de REGISTRO_DTYPE: acceso al azar sin copiar ni leer
+# todo el archivo, p. ej. regs["sobre"]["payload"][1000:2000] o regs["t"].
+
+import os
+import struct
+
+import numpy as np
+
+from . import sobre
+
+MAGIC = b"P4CP"
+VERSION = 1
+_CAB_FMT = ">4sHHBBHQ12x"
+CABECERA_BYTES = struct.calcsize(_CAB_FMT)  # 32
+
+PUNTOS = {"transmisor": 1, "canal": 2, "receptor": 3}
+
+REGISTRO_DTYPE = np.dtype([("t", ">u8"), ("sobre", sobre.SOBRE_DTYPE)])
+REGISTRO_BYTES = REGISTRO_DTYPE.itemsize  # 100
+
+
+class Grabador:
+    """Tap de captura: agrega registros al archivo. Un Grabador por hilo que graba."""
+
+    def __init__(self, ruta, punto, buffer_bytes=1 << 20):
+        self.punto = punto
+        nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) == 0
+        self.f = open(ruta, "ab", buffering=buffer_bytes)
+        if nuevo:
+            self.f.write(struct.pack(_CAB_FMT, MAGIC, VERSION, REGISTRO_BYTES, PUNTOS[punto], 0,
+                                     sobre.FRAME_BYTES, sobre.timestamp_us()))
+        else:
+            leer_cabecera(ruta)  # que sea una captura válida antes de agregarle registros
+        self.registros = 0
+
+    def grabar(self, sobres, t=None):
+        """k sobres (array SOBRE_DTYPE) -> k registros, todos con el mismo t."""
+        regs = np.empty(len(sobres), dtype=REGISTRO_DTYPE)
+        regs["t"] = sobre.timestamp_us() if t is None else t
+        regs["sobre"] = sobres
+        self.f.write(regs.tobytes())
+        self.registros += len(regs)
+
+    def grabar_bytes(self, datos, stream=0, seq=0, t=None):
+        """Bytes tal como salen al cable: sobres v2 seguidos o tramas crudas de 68 bytes
+        (a estas se les arma el sobre con stream y seq)."""
+        if sobre.es_sobre(datos):
+            s = np.frombuffer(datos, dtype=sobre.SOBRE_DTYPE)
+        else:
+            s = sobre.armar(stream, seq, datos)
+        self.grabar(s, t)
+
+    def cerrar(self):
+        self.f.close()
+
+
+def leer_cabecera(ruta):
+    """-> dict con versión, punto, registro, payload y t0; ValueError si no es una captura."""
+    with open(ruta, "rb") as f:
+        cab = f.read(CABECERA_BYTES)
+    if len(cab) < CABECERA_BYTES or cab[:4] != MAGIC:
+        raise ValueError(f"{ruta}: no es una captura PAM4")
+    _, version, registro, punto, _, payload, t0 = struct.unpack(_CAB_FMT, cab)
+    if version != VERSION or registro != REGISTRO_BYTES or payload != sobre.FRAME_BYTES:
+        raise ValueError(f"{ruta}: versión {version} / registro {registro} B / trama {payload} B no soportados")
+    nombres = {v: k for k, v in PUNTOS.items()}
+    return {"version": version, "punto": nombres.get(punto, str(punto)), "registro": registro,
+            "payload": payload, "t0": t0}
+
+
+def abrir(ruta):
+    """-> (cabecera, registros) con registros = np.memmap de solo lectura (k,) REGISTRO_DTYPE."""
+    cab = leer_cabecera(ruta)
+    k = (os.path.getsize(ruta) - CABECERA_BYTES) // REGISTRO_BYTES
+    if k == 0:
+        return cab, np.empty(0, dtype=REGISTRO_DTYPE)
+    return cab, np.memmap(ruta, dtype=REGISTRO_DTYPE, mode="r", offset=CABECERA_BYTES, shape=(k,))
@@ -0,0 +1,101 @@
+# codec.py - Codec PAM4 compartido por transmisor, canal, receptor y monitor
+#
+# Convención (igual en toda la cadena):
+#   - 2 bits por símbolo, valores 0..3
+#   - 4 símbolos por byte, MSB primero: S0=b7..b6, S1=b5..b4, S2=b3..b2, S3=b1..b0
+#
+# Con NumPy todo se hace por lotes (tabla 256x4 + reshape/shifts).
+# Sin NumPy (MicroPython en la ESP32) se usa una tabla de bytes equivalente.
+
+try:
+    import numpy as np
+except ImportError:  # MicroPython sin ulab
+    np = None
+
+SIMBOLOS_POR_BYTE = 4
+BINS_POR_TRAMA = 64
+
+if np is not None:
+    _DESPLAZAMIENTOS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+    # Tabla 256x4: fila b = los 4 símbolos del byte b
+    TABLA_SIMBOLOS = (np.arange(256, dtype=np.uint8)[:, None] >> _DESPLAZAMIENTOS) & 3
+
+    def _como_uint8(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return np.frombuffer(data, dtype=np.uint8)
+        return np.asarray(data, dtype=np.uint8)
+
+    def bytes_a_simbolos(data):
+        """Bytes empaquetados -> array uint8 de símbolos (4 por byte)."""
+        return TABLA_SIMBOLOS[_como_uint8(data)].reshape(-1)
+
+    def simbolos_a_array(simbolos):
+        """Símbolos (0..3) -> array uint8 de bytes empaquetados.
+
+        Si la cantidad no es múltiplo de 4, el último byte se completa con ceros.
+        """
+        s = np.asarray(simbolos, dtype=np.uint8)
+        resto = (-s.size) % SIMBOLOS_POR_BYTE
+        if resto:
+            s = np.concatenate([s, np.zeros(resto, dtype=np.uint8)])
+        g = (s & 3).reshape(-1, SIMBOLOS_POR_BYTE)
+        return (g[:, 0] << 6) | (g[:, 1] << 4) | (g[:, 2] << 2) | g[:, 3]
+
+    def simbolos_a_bytes(simbolos):
+        """Símbolos (0..3) -> bytes listos para enviar por socket."""
+        return simbolos_a_array(simbolos).tobytes()
+
+    def simbolos_a_bins(simbolos, n_bins=BINS_POR_TRAMA):
+        """Primeros 4*n_bins símbolos -> n_bins valores de 8 bits (0..255).
+
+        Devuelve None si no alcanzan los símbolos.
+        """
+        s = np.asarray(simbolos, dtype=np.uint8)
+        n = n_bins * SIMBOLOS_POR_BYTE
+        if s.size < n:
+            return None
+        return simbolos_a_array(s[:n])
+
+    def contar_simbolos(simbolos):
+        """Histograma de niveles PAM4 -> array de 4 cuentas."""
+        s = np.asarray(simbolos, dtype=np.uint8)
+        return np.bincount(s & 3, minlength=4)
+
+else:
+    TABLA_SIMBOLOS = [bytes(((b >> 6) & 3, (b >> 4) & 3, (b >> 2) & 3, b & 3))
+                      for b in range(256)]
+
+    def bytes_a_simbolos(data):
+        """Bytes empaquetados -> bytearray de símbolos (4 por byte)."""
+        return bytearray(b"".join([TABLA_SIMBOLOS[b] for b in data]))
+
+    def simbolos_a_array(simbolos):
+        """Símbolos (0..3) -> bytearray de bytes empaquetados."""
+        n = len(simbolos)
+        out = bytearray((n + SIMBOLOS_POR_BYTE - 1) // SIMBOLOS_POR_BYTE)
+        for i in range(len(out)):
+            j = i * SIMBOLOS_POR_BYTE
+            v = 0
+            for k in range(SIMBOLOS_POR_BYTE):
+                v = (v << 2) | ((simbolos[j + k] & 3) if j + k < n else 0)
+            out[i] = v
+        return out
+
+    def simbolos_a_bytes(simbolos):
+        """Símbolos (0..3) -> bytes listos para enviar por socket."""
+        return bytes(simbolos_a_array(simbolos))
+
+    def simbolos_a_bins(simbolos, n_bins=BINS_POR_TRAMA):
+        """Primeros 4*n_bins símbolos -> n_bins valores de 8 bits (0..255)."""
+        n = n_bins * SIMBOLOS_POR_BYTE
+        if len(simbolos) < n:
+            return None
+        return simbolos_a_array(simbolos[:n])
+
+    def contar_simbolos(simbolos):
+        """Histograma de niveles PAM4 -> lista de 4 cuentas."""
+        counts = [0, 0, 0, 0]
+        for s in simbolos:
+            counts[s & 3] += 1
+        return counts
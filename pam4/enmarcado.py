@@ -0,0 +1,56 @@
+# enmarcado.py - Reensamblado de tramas de tamaño fijo sobre un stream TCP
+#
+# Un recv() puede traer media trama o varias juntas. Enmarcador usa un único
+# bytearray preasignado: se recibe directo en su espacio libre (recv_into /
+# readinto / BufferedProtocol.get_buffer) y cada vez se entregan TODAS las tramas
+# completas juntas, como una memoryview de k*frame_bytes bytes. El resto (< 1
+# trama) se mueve al principio una sola vez por lote, antes de la próxima recepción.
+#
+# Sin NumPy: corre también en MicroPython.
+
+FRAME_BYTES = 68  # "hola" (4) + 64 amplitudes
+
+
+class Enmarcador:
+    def __init__(self, frame_bytes=FRAME_BYTES, max_tramas=32):
+        self.frame_bytes = frame_bytes
+        self.buf = bytearray(frame_bytes * max_tramas)
+        self.mv = memoryview(self.buf)
+        self.n = 0          # bytes válidos en buf
+        self.entregado = 0  # bytes del último lote, se descartan al compactar
+
+    def _compactar(self):
+        if self.entregado:
+            resto = self.n - self.entregado
+            if resto:
+                self.mv[:resto] = self.mv[self.entregado:self.n]
+            self.n = resto
+            self.entregado = 0
+
+    def espacio(self):
+        """Memoryview del espacio libre, para recibir directamente ahí."""
+        self._compactar()
+        return self.mv[self.n:]
+
+    def avanzar(self, nbytes):
+        """Registra nbytes recibidos en espacio() -> memoryview con las tramas completas.
+
+        La vista es válida hasta la próxima llamada a espacio() / alimentar().
+        """
+        self.n += nbytes
+        self.entregado = self.n - self.n % self.frame_bytes
+        return self.mv[:self.entregado]
+
+    def alimentar(self, data):
+        """Variante para quien ya tiene los bytes (copia en el buffer) -> lista de lotes."""
+        lotes = []
+        data = memoryview(data)
+        while data:
+            libre = self.espacio()
+            k = min(len(libre), len(data))
+            libre[:k] = data[:k]
+            data = data[k:]
+            lote = self.avanzar(k)
+            if lote:
+                lotes.append(bytes(lote))
+        return lotes
@@ -0,0 +1,306 @@
+# metricas.py - Métricas compartidas de la cadena PAM4 (contadores, medidores, histogramas)
+#
+# Como registro.py: cada módulo pide sus métricas por nombre y el script principal
+# decide cómo se publican.
+#
+#     tramas = metricas.contador("canal_tramas_entrada_total", "Tramas recibidas")
+#     tramas.sumar(len(lote))                      # lazo caliente: sin locks
+#     metricas.medidor("canal_transmisores", lambda: len(activos), "Transmisores conectados")
+#     proceso = metricas.histograma("canal_procesar_us", "Tiempo por lote (µs)")
+#     with proceso.medir():
+#         ...
+#
+# - Contador: cada hilo suma en su propia celda (threading.local) y al leer se suman
+#   todas; el hilo que cuenta nunca toma un lock ni pisa la cuenta de otro.
+# - Medidor: una función que se evalúa recién al leer (largo de una cola, conectados,
+#   o las estadísticas que cada componente ya lleva). Con `etiqueta`, la función
+#   devuelve un dict valor_de_etiqueta -> número (p. ej. una cola por suscriptor).
+# - Histograma: cubetas log-lineales tipo HDR (exactas hasta 63, después 32 por cada
+#   potencia de 2: ~3% de error relativo de 1 µs a días), también con celdas por hilo.
+#
+# Publicación:
+#   texto()        formato de texto de Prometheus (los histogramas como summary con
+#                  cuantiles 0.5 / 0.9 / 0.99 / 0.999)
+#   servir(puerto) ese texto por HTTP en 127.0.0.1:puerto, en un hilo aparte
+#   instantanea()  dict plano nombre -> valor, para mandarlo por el canal de control
+#                  (relay.py lo manda a pc_admin.py como "METRICAS {json}")
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from . import registro
+
+PREFIJO = "pam4_"
+CUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Cubetas: valores < 64 exactos; después 32 por potencia de 2 (hasta 2**41 µs)
+_SUB = 6
+_N_EXACTAS = 1 << _SUB
+_MITAD = 1 << (_SUB - 1)
+_MAX_EXP = 35
+N_CUBETAS = _N_EXACTAS + _MAX_EXP * _MITAD
+
+log = registro.obtener("metricas")
+
+_metricas = {}  # (nombre, etiquetas) -> métrica, en orden de alta
+_lock = threading.Lock()
+
+
+def _clave(etiquetas):
+    return tuple(sorted((etiquetas or {}).items()))
+
+
+def _registrar(cls, nombre, ayuda, etiquetas, *args):
+    clave = (nombre, _clave(etiquetas))
+    with _lock:
+        m = _metricas.get(clave)
+        if m is None:
+            m = _metricas[clave] = cls(nombre, ayuda, dict(etiquetas or {}), *args)
+        return m
+
+
+class _PorHilo:
+    """Una celda por hilo; la lista de celdas solo se toca (con lock) al aparecer un hilo."""
+
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._local = threading.local()
+        self._celdas = []
+        self._lock_celdas = threading.Lock()
+
+    def _celda(self):
+        try:
+            return self._local.celda
+        except AttributeError:
+            c = self._local.celda = self._nueva()
+            with self._lock_celdas:
+                self._celdas.append(c)
+            return c
+
+    def celdas(self):
+        with self._lock_celdas:
+            return tuple(self._celdas)
+
+
+class Contador(_PorHilo):
+    tipo = "counter"
+
+    def _nueva(self):
+        return [0]
+
+    def sumar(self, n=1):
+        self._celda()[0] += n
+
+    def valor(self):
+        return sum(c[0] for c in self.celdas())
+
+    def muestras(self):
+        yield "", self.etiquetas, self.valor()
+
+
+class Medidor:
+    def __init__(self, nombre, ayuda, etiquetas, funcion, etiqueta=None, tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.funcion = funcion
+        self.etiqueta = etiqueta
+        self.tipo = tipo
+
+    def muestras(self):
+        try:
+            v = self.funcion()
+        except Exception as e:  # un medidor roto no tira abajo la página entera
+            log.warning("⚠ medidor %s: %s", self.nombre, e)
+            return
+        if self.etiqueta is None:
+            yield "", self.etiquetas, v
+            return
+        for valor_etiqueta, x in v.items():
+            yield "", dict(self.etiquetas, **{self.etiqueta: valor_etiqueta}), x
+
+
+def cubeta(v):
+    """Valor (entero >= 0) -> índice de cubeta."""
+    v = max(0, int(v))
+    if v < _N_EXACTAS:
+        return v
+    e = v.bit_length() - _SUB
+    if e > _MAX_EXP:
+        return N_CUBETAS - 1
+    return _N_EXACTAS + (e - 1) * _MITAD + (v >> e) - _MITAD
+
+
+def _cubetas(valores):
+    v = np.maximum(np.asarray(valores, dtype=np.int64), 0)
+    e = np.zeros(v.shape, dtype=np.int64)
+    grandes = v >= _N_EXACTAS
+    e[grandes] = np.floor(np.log2(v[grandes])).astype(np.int64) + 1 - _SUB
+    i = np.where(grandes, _N_EXACTAS + (e - 1) * _MITAD + (v >> e) - _MITAD, v)
+    return np.minimum(i, N_CUBETAS - 1)
+
+
+def limite(i):
+    """Índice de cubeta -> mayor valor que cae en ella."""
+    if i < _N_EXACTAS:
+        return i
+    e = (i - _N_EXACTAS) // _MITAD + 1
+    m = (i - _N_EXACTAS) % _MITAD + _MITAD
+    return ((m + 1) << e) - 1
+
+
+class _Cronometro:
+    __slots__ = ("h", "t0")
+
+    def __init__(self, h):
+        self.h = h
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.h.registrar((time.perf_counter_ns() - self.t0) // 1000)
+
+
+class Histograma(_PorHilo):
+    tipo = "summary"
+
+    def _nueva(self):
+        return [[0] * N_CUBETAS, 0, 0]  # cuentas, suma, cantidad
+
+    def registrar(self, v):
+        c = self._celda()
+        c[0][cubeta(v)] += 1
+        c[1] += v
+        c[2] += 1
+
+    def registrar_lote(self, valores):
+        """Array de valores de una vez (p. ej. la latencia de cada trama de un lote)."""
+        valores = np.asarray(valores)
+        if not valores.size:
+            return
+        c = self._celda()
+        idx, k = np.unique(_cubetas(valores), return_counts=True)
+        cuentas = c[0]
+        for i, n in zip(idx.tolist(), k.tolist()):
+            cuentas[i] += n
+        c[1] += int(valores.sum())
+        c[2] += int(valores.size)
+
+    def medir(self):
+        """with h.medir(): ... registra la duración del bloque en µs."""
+        return _Cronometro(self)
+
+    def _juntar(self):
+        cuentas = np.zeros(N_CUBETAS, dtype=np.int64)
+        suma = n = 0
+        for c in self.celdas():
+            cuentas += c[0]
+            suma += c[1]
+            n += c[2]
+        return cuentas, suma, n
+
+    def cuantiles(self, qs=CUANTILES):
+        cuentas, suma, n = self._juntar()
+        if not n:
+            return {q: 0 for q in qs}, suma, n
+        acum = np.cumsum(cuentas)
+        return {q: limite(int(np.searchsorted(acum, q * n))) for q in qs}, suma, n
+
+    def muestras(self):
+        cs, suma, n = self.cuantiles()
+        for q, v in cs.items():
+            yield "", dict(self.etiquetas, quantile=str(q)), v
+        yield "_sum", self.etiquetas, suma
+        yield "_count", self.etiquetas, n
+
+
+def contador(nombre, ayuda="", etiquetas=None):
+    return _registrar(Contador, nombre, ayuda, etiquetas)
+
+
+def histograma(nombre, ayuda="", etiquetas=None):
+    return _registrar(Histograma, nombre, ayuda, etiquetas)
+
+
+def medidor(nombre, funcion, ayuda="", etiquetas=None, etiqueta=None, tipo="gauge"):
+    """Valor calculado al leer; tipo="counter" si la función devuelve un total acumulado."""
+    m = _registrar(Medidor, nombre, ayuda, etiquetas, funcion, etiqueta, tipo)
+    m.funcion = funcion  # al volver a registrarlo (p. ej. otro objeto), la función nueva
+    return m
+
+
+def _nombre(nombre, sufijo, etiquetas):
+    if not etiquetas:
+        return PREFIJO + nombre + sufijo
+    return PREFIJO + nombre + sufijo + "{" + ",".join(f'{k}="{v}"' for k, v in etiquetas.items()) + "}"
+
+
+def texto():
+    """Todas las métricas en el formato de texto de Prometheus."""
+    with _lock:
+        metricas = list(_metricas.values())
+    lineas, vistos = [], set()
+    for m in metricas:
+        if m.nombre not in vistos:
+            vistos.add(m.nombre)
+            if m.ayuda:
+                lineas.append(f"# HELP {PREFIJO}{m.nombre} {m.ayuda}")
+            lineas.append(f"# TYPE {PREFIJO}{m.nombre} {m.tipo}")
+        for sufijo, etiquetas, v in m.muestras():
+            lineas.append(f"{_nombre(m.nombre, sufijo, etiquetas)} {int(v) if isinstance(v, bool) else v}")
+    return "\n".join(lineas) + "\n"
+
+
+def instantanea():
+    """dict plano nombre -> valor (de los histogramas: p50, p99 y cantidad), con "t" en segundos."""
+    with _lock:
+        metricas = list(_metricas.values())
+    out = {"t": round(time.time(), 3)}
+    for m in metricas:
+        if isinstance(m, Histograma):
+            cs, _, n = m.cuantiles((0.5, 0.99))
+            base = _nombre(m.nombre, "", m.etiquetas)[len(PREFIJO):]
+            out[base + "_p50"], out[base + "_p99"], out[base + "_count"] = cs[0.5], cs[0.99], n
+            continue
+        for sufijo, etiquetas, v in m.muestras():
+            out[_nombre(m.nombre, sufijo, etiquetas)[len(PREFIJO):]] = v
+    return out
+
+
+def instantanea_json():
+    return json.dumps(instantanea(), separators=(",", ":"), ensure_ascii=False)
+
+
+class _Pagina(BaseHTTPRequestHandler):
+    def do_GET(self):
+        cuerpo = texto().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir(puerto, host="127.0.0.1"):
+    """Página de texto con todas las métricas en http://host:puerto/ (hilo aparte).
+    Si el puerto está ocupado avisa y sigue sin ella (devuelve None)."""
+    try:
+        srv = ThreadingHTTPServer((host, puerto), _Pagina)
+    except OSError as e:
+        log.warning("⚠ métricas: no se pudo abrir %s:%s (%s)", host, puerto, e)
+        return None
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="métricas", daemon=True).start()
+    log.info("📊 Métricas en http://%s:%s/metrics", host, puerto)
+    return srv
@@ -0,0 +1,38 @@
+# reconstruccion.py - Reconstrucción temporal de los 64 bins (equivalente a la IFFT)
+#
+# El transmisor y el monitor arman un espectro de N = fs*duracion puntos con
+# espectro[int(f*duracion)] = A (f = 100, 200, ..., 6400 Hz) y toman ifft(...).real.
+# Eso es lo mismo que sumar cosenos:
+#
+#     x[n] = (1/N) * sum_i A_i * cos(2*pi * k_i * n / N)
+#
+# así que la base 64 x n se precalcula una vez y cada trama se reconstruye con un
+# producto matriz-vector. Solo se calculan las muestras de la ventana que se
+# muestra (zoom), no los 100 ms completos.
+
+import numpy as np
+
+FS = 44100
+DURACION = 0.1
+FRECUENCIAS = [i * 100 for i in range(1, 65)]
+
+
+class Reconstructor:
+    def __init__(self, freqs=FRECUENCIAS, fs=FS, duracion=DURACION, ventana=None):
+        N = int(fs * duracion)
+        n = N if ventana is None else min(N, int(fs * ventana))
+        self.t = np.arange(n) / fs  # igual a linspace(0, duracion, N, endpoint=False)[:n]
+        # Mismo índice espectral que la versión con IFFT
+        idx = np.array([int(f * duracion) for f in freqs], dtype=np.int64)
+        validos = idx < N
+        self.base = np.zeros((len(freqs), n))
+        fase = (np.outer(idx[validos], np.arange(n)) % N) * (2 * np.pi / N)
+        self.base[validos] = np.cos(fase) / N
+
+    def senal(self, amplitudes):
+        """Bins (64) -> muestras de la ventana."""
+        return np.asarray(amplitudes, dtype=float) @ self.base
+
+    def lote(self, tramas):
+        """Matriz (tramas x 64) -> matriz (tramas x muestras), tipo espectrograma."""
+        return np.asarray(tramas, dtype=float) @ self.base
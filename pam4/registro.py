@@ -0,0 +1,222 @@
+# registro.py - Logging compartido de la cadena PAM4 (transmisor, canal, receptor)
+#
+# Cada componente pide su logger con obtener("canal"), obtener("receptor"), ... y el
+# script llama una vez a configurar() con el nivel (--log debug|info|warning|error).
+#
+# - Emisión fuera del hilo: configurar() pone un QueueHandler en el logger "pam4" y un
+#   QueueListener formatea y escribe en otro hilo. El hilo que loguea solo encola.
+# - Mensajes por trama: Limitador deja pasar a lo sumo `por_segundo` y, al volver a
+#   emitir, agrega cuántos se suprimieron.
+# - Traza binaria opcional (TrazaBinaria): registros fijos de 20 bytes con timestamp,
+#   evento, stream, seq y un valor, para analizar después con leer_traza().
+#
+# En los lazos calientes el mensaje se arma solo si va a salir:
+#
+#     if log.isEnabledFor(DEBUG):
+#         log.debug("símbolos: %s", simbolos.tolist())
+#
+# Con nivel INFO esa comprobación no crea objetos (logging cachea el resultado por
+# logger), así un debug apagado no formatea, no arma LogRecord ni encola nada.
+#
+# Sin el módulo logging (MicroPython en la ESP32) hay un logger mínimo con la misma
+# interfaz que escribe con print(), en el mismo hilo.
+
+import struct
+import time
+
+try:
+    import logging
+    import logging.handlers
+    import queue
+except ImportError:  # MicroPython
+    logging = None
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+NIVELES = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+_reloj = getattr(time, "monotonic", None) or (lambda: time.ticks_ms() / 1000)
+
+
+def nivel(valor):
+    """'debug' / 'INFO' / 20 -> nivel numérico."""
+    if isinstance(valor, int):
+        return valor
+    try:
+        return NIVELES[valor.lower()]
+    except KeyError:
+        raise ValueError(f"nivel de log desconocido: {valor!r} (opciones: {', '.join(NIVELES)})")
+
+
+if logging is not None:
+    FORMATO = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+    _listener = None
+
+    def obtener(nombre):
+        return logging.getLogger("pam4." + nombre)
+
+    def configurar(nivel_log="info", archivo=None):
+        """Nivel de todos los loggers "pam4.*" y salida por consola (y archivo) en otro hilo.
+
+        Se puede volver a llamar (p. ej. para cambiar el nivel); devuelve el QueueListener.
+        """
+        global _listener
+        raiz = logging.getLogger("pam4")
+        raiz.setLevel(nivel(nivel_log))
+        raiz.propagate = False
+        if _listener is not None:
+            _listener.stop()
+        for h in list(raiz.handlers):
+            raiz.removeHandler(h)
+
+        salidas = [logging.StreamHandler()]
+        if archivo:
+            salidas.append(logging.FileHandler(archivo, encoding="utf-8"))
+        formato = logging.Formatter(FORMATO, "%H:%M:%S")
+        for h in salidas:
+            h.setFormatter(formato)
+
+        cola = queue.SimpleQueue()
+        raiz.addHandler(logging.handlers.QueueHandler(cola))
+        _listener = logging.handlers.QueueListener(cola, *salidas, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+    def cerrar():
+        """Vacía la cola de mensajes pendientes (llamar antes de salir)."""
+        global _listener
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+else:
+    _NOMBRES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+    _nivel = INFO
+
+    class _Logger:
+        def __init__(self, nombre):
+            self.name = "pam4." + nombre
+
+        def isEnabledFor(self, n):
+            return n >= _nivel
+
+        def log(self, n, msg, *args):
+            if n >= _nivel:
+                print(_NOMBRES.get(n, n), self.name + ":", msg % args if args else msg)
+
+        def debug(self, msg, *args):
+            self.log(DEBUG, msg, *args)
+
+        def info(self, msg, *args):
+            self.log(INFO, msg, *args)
+
+        def warning(self, msg, *args):
+            self.log(WARNING, msg, *args)
+
+        def error(self, msg, *args):
+            self.log(ERROR, msg, *args)
+
+    _loggers = {}
+
+    def obtener(nombre):
+        if nombre not in _loggers:
+            _loggers[nombre] = _Logger(nombre)
+        return _loggers[nombre]
+
+    def configurar(nivel_log="info", archivo=None):
+        global _nivel
+        _nivel = nivel(nivel_log)
+
+    def cerrar():
+        pass
+
+
+class Limitador:
+    """Tope de mensajes por segundo para un mensaje que se repite por trama.
+
+        lim = Limitador(log, por_segundo=2)
+        if lim.permitir():
+            lim.log("frame %d", idx)
+    """
+
+    def __init__(self, log, por_segundo=2.0, nivel_log=INFO):
+        self.logger = log
+        self.nivel = nivel(nivel_log)
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self.proximo = 0.0
+        self.suprimidos = 0
+
+    def permitir(self):
+        """True si este mensaje tiene que salir; si no, solo lo cuenta."""
+        if not self.logger.isEnabledFor(self.nivel):
+            return False
+        ahora = _reloj()
+        if ahora < self.proximo:
+            self.suprimidos += 1
+            return False
+        self.proximo = ahora + self.intervalo
+        return True
+
+    def log(self, msg, *args):
+        if self.suprimidos:
+            msg = f"{msg} (+{self.suprimidos} suprimidos)"
+            self.suprimidos = 0
+        self.logger.log(self.nivel, msg, *args)
+
+
+# --- Traza binaria: registros fijos, big-endian ---
+#   timestamp u64 (µs desde epoch), evento u16, stream u16, seq u32, valor u32
+TRAZA_FMT = ">QHHII"
+TRAZA_BYTES = struct.calcsize(TRAZA_FMT)  # 20
+
+# Eventos
+EV_TRAMA_TX = 1      # el transmisor encoló una trama (valor = bytes)
+EV_TRAMA_RX = 2      # llegó una trama (valor = 1 si el CRC es válido)
+EV_CRC_MALO = 3      # trama con CRC inválido
+EV_PERDIDA = 4       # hueco de seq (valor = tramas perdidas)
+EV_ERRORES = 5       # el canal alteró símbolos (valor = cantidad, seq = tramas del lote)
+EV_DESCARTE = 6      # lote descartado por una cola llena (valor = lotes)
+
+
+def _ahora_us():
+    if hasattr(time, "time_ns"):
+        return time.time_ns() // 1000
+    return int(time.time() * 1000000)
+
+
+class TrazaBinaria:
+    """Archivo de eventos de tamaño fijo. Se escribe en un buffer preasignado que se
+    vuelca al archivo cada `registros` eventos (y al cerrar)."""
+
+    def __init__(self, ruta, registros=4096):
+        self.f = open(ruta, "ab")
+        self.buf = bytearray(TRAZA_BYTES * registros)
+        self.i = 0
+        self.escritos = 0
+
+    def registrar(self, evento, stream=0, seq=0, valor=0, timestamp=None):
+        if timestamp is None:
+            timestamp = _ahora_us()
+        struct.pack_into(TRAZA_FMT, self.buf, self.i, timestamp, evento, stream,
+                         seq & 0xFFFFFFFF, valor & 0xFFFFFFFF)
+        self.i += TRAZA_BYTES
+        self.escritos += 1
+        if self.i == len(self.buf):
+            self.volcar()
+
+    def volcar(self):
+        if self.i:
+            self.f.write(memoryview(self.buf)[:self.i])
+            self.f.flush()
+            self.i = 0
+
+    def cerrar(self):
+        self.volcar()
+        self.f.close()
+
+
+def leer_traza(ruta):
+    """Archivo de TrazaBinaria -> array NumPy con campos timestamp, evento, stream, seq, valor."""
+    import numpy as np
+    dtype = np.dtype([("timestamp", ">u8"), ("evento", ">u2"), ("stream", ">u2"),
+                      ("seq", ">u4"), ("valor", ">u4")])
+    return np.fromfile(ruta, dtype=dtype)
@@ -0,0 +1,125 @@
+# ruido.py - Inyección de errores del canal sobre arrays de símbolos PAM4
+#
+# Todo se hace con máscaras de NumPy sobre el lote completo de símbolos. Los
+# primeros `protegidos` símbolos de cada trama (el prefijo "hola") nunca se alteran.
+#
+# Modelos:
+#   uniforme : cada símbolo cambia con prob. `tasa` a cualquiera de los otros 3 niveles
+#   gray     : cada símbolo cambia con prob. `tasa` a un nivel adyacente (±1)
+#   gilbert  : Gilbert-Elliott; cadena de Markov bueno/malo con transiciones
+#              p (bueno -> malo) y r (malo -> bueno); en el estado malo el error
+#              es `tasa` y en el bueno `tasa_buena`. El estado sigue entre lotes.
+#   awgn     : niveles -3/-1/1/3 + ruido gaussiano de desvío `sigma`, y decisión
+#              al nivel más cercano
+#
+# Con la misma `semilla` y los mismos datos, la salida es reproducible.
+
+import numpy as np
+
+from .codec import SIMBOLOS_POR_BYTE
+
+MODELOS = ("uniforme", "gray", "gilbert", "awgn")
+NIVELES = np.array([-3.0, -1.0, 1.0, 3.0])
+
+
+class InyectorErrores:
+    def __init__(self, modelo="uniforme", tasa=0.05, semilla=None, protegidos=16,
+                 frame_bytes=68, tasa_buena=0.0, p=0.01, r=0.1, sigma=0.5):
+        self.simbolos_trama = frame_bytes * SIMBOLOS_POR_BYTE
+        self.protegidos = protegidos
+        self.modelo = "uniforme"
+        self.tasa = tasa
+        self.tasa_buena = tasa_buena
+        self.p = p
+        self.r = r
+        self.sigma = sigma
+        self.configurar(modelo=modelo, semilla=semilla)
+
+    def configurar(self, modelo=None, tasa=None, semilla=None, tasa_buena=None,
+                   p=None, r=None, sigma=None):
+        """Cambia parámetros; los que quedan en None no se tocan."""
+        if modelo is not None:
+            if modelo not in MODELOS:
+                raise ValueError(f"modelo desconocido: {modelo!r} (opciones: {', '.join(MODELOS)})")
+            self.modelo = modelo
+        for nombre, valor in (("tasa", tasa), ("tasa_buena", tasa_buena),
+                              ("p", p), ("r", r), ("sigma", sigma)):
+            if valor is not None:
+                setattr(self, nombre, float(valor))
+        if semilla is not None or not hasattr(self, "rng"):
+            self.rng = np.random.default_rng(None if semilla is None else int(semilla))
+            self.semilla = semilla
+            self._malo = True  # el primer cambio de estado arranca en "bueno"
+            self._resto = 0
+
+    def __str__(self):
+        extra = {
+            "gilbert": f" p={self.p} r={self.r} tasa_buena={self.tasa_buena}",
+            "awgn": f" sigma={self.sigma}",
+        }.get(self.modelo, "")
+        tasa = "" if self.modelo == "awgn" else f" tasa={self.tasa}"
+        return f"modelo={self.modelo}{tasa}{extra} semilla={self.semilla}"
+
+    def _mascara_protegida(self, n):
+        idx = np.arange(n) % self.simbolos_trama
+        return idx >= self.protegidos
+
+    def _estados_gilbert(self, n):
+        malo = np.empty(n, dtype=bool)
+        i = 0
+        while i < n:  # un ciclo por estadía, no por símbolo
+            if self._resto == 0:
+                self._malo = not self._malo
+                self._resto = int(self.rng.geometric(self.r if self._malo else self.p))
+            k = min(self._resto, n - i)
+            malo[i:i + k] = self._malo
+            i += k
+            self._resto -= k
+        return malo
+
+    def aplicar(self, simbolos):
+        """Símbolos (0..3) -> (array uint8 con errores, cantidad de símbolos alterados)."""
+        s = np.array(simbolos, dtype=np.uint8)
+        n = s.size
+        if n == 0:
+            return s, 0
+        rng = self.rng
+        alterables = self._mascara_protegida(n)
+
+        if self.modelo == "awgn":
+            v = NIVELES[s] + rng.normal(0.0, self.sigma, n)
+            nuevo = np.clip(np.rint((v + 3.0) / 2.0), 0, 3).astype(np.uint8)
+            mask = alterables & (nuevo != s)
+            s[mask] = nuevo[mask]
+            return s, int(mask.sum())
+
+        if self.modelo == "gilbert":
+            prob = np.where(self._estados_gilbert(n), self.tasa, self.tasa_buena)
+            mask = rng.random(n) < prob
+        else:
+            mask = rng.random(n) < self.tasa
+        mask &= alterables
+        k = int(mask.sum())
+        if k == 0:
+            return s, 0
+
+        if self.modelo == "gray":
+            nuevo = s[mask].astype(np.int16) + rng.choice(np.array([-1, 1], dtype=np.int16), k)
+            nuevo[nuevo < 0] = 1   # desde el nivel 0 solo se puede ir al 1
+            nuevo[nuevo > 3] = 2   # desde el nivel 3 solo se puede ir al 2
+            s[mask] = nuevo
+        else:
+            # Sumar 1..3 (mod 4) garantiza un nivel distinto al original
+            s[mask] = (s[mask] + rng.integers(1, 4, k, dtype=np.uint8)) & 3
+        return s, k
+
+
+def parsear_config(txt):
+    """'modelo=gray tasa=0.01 semilla=42' -> dict para InyectorErrores.configurar()."""
+    kw = {}
+    for par in txt.split():
+        clave, _, valor = par.partition("=")
+        if not valor:
+            raise ValueError(f"parámetro inválido: {par!r}")
+        kw[clave] = valor if clave == "modelo" else (int(valor) if clave == "semilla" else float(valor))
+    return kw
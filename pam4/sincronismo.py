@@ -0,0 +1,77 @@
+# sincronismo.py - Sincronismo de tramas PAM4 sobre un AnilloSimbolos
+#
+# Trama: cabecera de 16 símbolos ("hola") + 256 símbolos de payload = 272 símbolos.
+#
+# El sincronizador guarda su posición absoluta en el anillo entre llamadas:
+#   - Buscando: revisa solo los símbolos que llegaron desde la última llamada
+#     (más los últimos 15, por si la cabecera quedó partida).
+#   - Enganchado: ya conoce el período de 272 símbolos, así que solo compara la
+#     cabecera en la posición esperada. Si no coincide, vuelve a buscar.
+# El costo escala con los datos nuevos, no con el tamaño del buffer.
+
+import numpy as np
+
+from . import codec
+
+CABECERA_HOLA = codec.bytes_a_simbolos(b"hola")  # [1,2,2,0, 1,2,3,3, 1,2,3,0, 1,2,0,1]
+
+
+def buscar_cabeceras(simbolos, cabecera=CABECERA_HOLA):
+    """Posiciones (array) donde `cabecera` aparece completa dentro de `simbolos`."""
+    s = np.asarray(simbolos, dtype=np.uint8)
+    cab = np.asarray(cabecera, dtype=np.uint8)
+    h = cab.size
+    if s.size < h:
+        return np.empty(0, dtype=np.intp)
+    cand = np.flatnonzero(s[:s.size - h + 1] == cab[0])
+    if cand.size == 0:
+        return cand
+    ok = (s[cand[:, None] + np.arange(1, h)] == cab[1:]).all(axis=1)
+    return cand[ok]
+
+
+class SincronizadorTramas:
+    def __init__(self, cabecera=CABECERA_HOLA, n_bins=codec.BINS_POR_TRAMA):
+        self.cabecera = np.asarray(cabecera, dtype=np.uint8)
+        self.h_len = self.cabecera.size
+        self.n_bins = n_bins
+        self.periodo = self.h_len + n_bins * codec.SIMBOLOS_POR_BYTE
+        self.reset()
+
+    def reset(self):
+        self.pos = 0            # próxima posición absoluta a examinar
+        self.bloqueado = False  # enganchado al período de trama
+        self.ultima = -1        # posición absoluta de la última cabecera válida
+
+    def avanzar(self, anillo):
+        """Procesa lo nuevo del anillo -> lista de (posición_cabecera, bins[64])."""
+        tramas = []
+        fin = anillo.escrito
+        h = self.h_len
+        while True:
+            if self.bloqueado:
+                if self.pos < fin - anillo.capacidad:
+                    self.bloqueado = False  # el escritor nos pasó por encima
+                elif self.pos + self.periodo > fin:
+                    break  # trama todavía incompleta
+                else:
+                    t = anillo.ventana(self.pos, self.pos + self.periodo)
+                    if np.array_equal(t[:h], self.cabecera):
+                        tramas.append((self.pos, codec.simbolos_a_bins(t[h:], self.n_bins)))
+                        self.ultima = self.pos
+                        self.pos += self.periodo
+                        continue
+                    self.bloqueado = False  # se perdió el sincronismo
+                    self.pos += 1
+
+            ini = max(self.pos, fin - anillo.capacidad)
+            if fin - ini < h:
+                self.pos = ini
+                break
+            hits = buscar_cabeceras(anillo.ventana(ini, fin), self.cabecera)
+            if hits.size == 0:
+                self.pos = fin - h + 1
+                break
+            self.pos = ini + int(hits[0])
+            self.bloqueado = True
+        return tramas
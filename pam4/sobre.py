@@ -0,0 +1,253 @@
+# sobre.py - Protocolo de tramas v2: sobre binario alrededor de cada trama PAM4
+#
+# Lo arma el transmisor (o el canal, si el transmisor manda tramas crudas) y viaja
+# por toda la cadena: canal -> receptor -> visualizador, y canal -> monitor.
+#
+#   0..1    magic      b"P4"
+#   2       versión    2
+#   3       flags      bit 0: sobre armado por el canal (transmisor sin protocolo v2)
+#   4..5    stream     u16, ID del transmisor (0 = que lo asigne el canal)
+#   6..9    seq        u32, número de trama de ese stream (vuelve a 0 en 2**32)
+#   10..17  timestamp  u64, microsegundos desde epoch de quien armó el sobre
+#   18..19  largo      u16, bytes de payload (68: "hola" + 64 amplitudes en PAM4)
+#   20..    payload
+#   +4      crc        u32, CRC-32 del payload
+#
+# Todo big-endian. El CRC cubre solo el payload: el canal puede completar el stream
+# sin recalcularlo, y los errores que el canal mete en los símbolos llegan al
+# receptor como CRC inválido.
+#
+# LectorSobres reensambla el stream TCP: con el largo sabe dónde termina cada sobre,
+# así que uno con otro largo o con CRC malo se saltea de una vez, y si la cabecera
+# está rota se resincroniza buscando el magic. Los sobres de 68 bytes seguidos se
+# leen juntos con una vista NumPy (SOBRE_DTYPE), sin parsear campo por campo.
+# Sin NumPy (MicroPython en la ESP32) se usa struct, sobre por sobre.
+#
+# La versión 1 (cabecera de 9 bytes sin timestamp, largo ni CRC) ya no se usa.
+
+import binascii
+import struct
+import time
+
+from .enmarcado import FRAME_BYTES
+
+try:
+    import numpy as np
+except ImportError:  # MicroPython sin ulab
+    np = None
+
+MAGIC = b"P4"
+VERSION = 2
+FLAG_CANAL = 1
+_FMT = ">2sBBHIQH"
+_PREFIJO = MAGIC + bytes((VERSION,))
+CABECERA_BYTES = struct.calcsize(_FMT)  # 20
+CRC_BYTES = 4
+SOBRE_BYTES = CABECERA_BYTES + FRAME_BYTES + CRC_BYTES  # 92 con el payload de siempre
+MAX_PAYLOAD = 1024  # un largo mayor se toma como cabecera rota
+SEQ_MOD = 1 << 32
+
+
+def es_sobre(data):
+    """True si data arranca con la cabecera v2 (para detectar el modo de una conexión)."""
+    return bytes(data[:3]) == _PREFIJO
+
+
+def crc(payload):
+    return binascii.crc32(payload) & 0xFFFFFFFF
+
+
+def timestamp_us():
+    return int(time.time() * 1000000)
+
+
+def perdidas(esperado, seq):
+    """Tramas que faltan entre el seq esperado y el recibido (con vuelta en 2**32)."""
+    return (seq - esperado) % SEQ_MOD
+
+
+def empaquetar(stream, seq, timestamp, flags, payload, crc_valor=None):
+    """Un sobre v2 -> bytes. Con crc_valor se respeta el CRC recibido (lo usa el canal)."""
+    if crc_valor is None:
+        crc_valor = crc(payload)
+    return (struct.pack(_FMT, MAGIC, VERSION, flags, stream, seq % SEQ_MOD, timestamp, len(payload))
+            + bytes(payload) + struct.pack(">I", crc_valor))
+
+
+class _LectorBase:
+    def __init__(self, max_tramas=32, descartar_crc=False):
+        self.buf = bytearray(max(SOBRE_BYTES * max_tramas, CABECERA_BYTES + MAX_PAYLOAD + CRC_BYTES))
+        self.mv = memoryview(self.buf)
+        self.n = 0    # bytes válidos en buf
+        self.ini = 0  # bytes ya consumidos, se descartan al compactar
+        self.descartar_crc = descartar_crc
+        # Estadísticas
+        self.bytes_descartados = 0  # basura salteada al resincronizar
+        self.otros_largos = 0       # sobres válidos con payload != 68, salteados
+        self.crc_malos = 0
+
+    def espacio(self):
+        """Memoryview del espacio libre, para recibir directamente ahí (recv_into / readinto)."""
+        if self.ini:
+            resto = self.n - self.ini
+            if resto:
+                self.mv[:resto] = self.mv[self.ini:self.n]
+            self.n = resto
+            self.ini = 0
+        return self.mv[self.n:]
+
+    def _largo(self, i):
+        """Largo del payload del sobre en i, o -1 si la cabecera no es válida."""
+        if bytes(self.mv[i:i + 3]) != _PREFIJO:
+            return -1
+        largo = (self.buf[i + 18] << 8) | self.buf[i + 19]
+        return largo if largo <= MAX_PAYLOAD else -1
+
+    def _resincronizar(self, i):
+        j = bytes(self.mv[i + 1:self.n]).find(_PREFIJO)  # solo con basura en el stream
+        j = i + 1 + j if j >= 0 else max(i + 1, self.n - len(_PREFIJO) + 1)
+        self.bytes_descartados += j - i
+        return j
+
+    def alimentar(self, data):
+        """Variante para quien ya tiene los bytes (copia en el buffer) -> lista de lotes."""
+        lotes = []
+        data = memoryview(data)
+        while data:
+            libre = self.espacio()
+            k = min(len(libre), len(data))
+            libre[:k] = data[:k]
+            data = data[k:]
+            sobres, ok = self.avanzar(k)
+            if len(sobres):
+                lotes.append((sobres.copy(), ok))  # la vista se pisa al compactar
+        return lotes
+
+
+if np is not None:
+    SOBRE_DTYPE = np.dtype([
+        ("magic", "S2"),
+        ("version", "u1"),
+        ("flags", "u1"),
+        ("stream", ">u2"),
+        ("seq", ">u4"),
+        ("timestamp", ">u8"),
+        ("largo", ">u2"),
+        ("payload", "u1", (FRAME_BYTES,)),
+        ("crc", ">u4"),
+    ])
+    _VACIO = np.empty(0, dtype=SOBRE_DTYPE)
+
+    def armar(stream, seq, tramas, timestamp=None, flags=0):
+        """k tramas de 68 bytes seguidas -> array SOBRE_DTYPE (k,); seq es el de la primera."""
+        t = np.frombuffer(tramas, dtype=np.uint8).reshape(-1, FRAME_BYTES)
+        out = np.empty(len(t), dtype=SOBRE_DTYPE)
+        out["magic"] = MAGIC
+        out["version"] = VERSION
+        out["flags"] = flags
+        out["stream"] = stream
+        out["seq"] = (seq + np.arange(len(t), dtype=np.uint64)) % SEQ_MOD
+        out["timestamp"] = timestamp_us() if timestamp is None else timestamp
+        out["largo"] = FRAME_BYTES
+        out["payload"] = t
+        out["crc"] = [crc(f) for f in t]
+        return out
+
+    def ensobrar(stream, seq, tramas, timestamp=None, flags=0):
+        """k tramas de 68 bytes seguidas -> k sobres v2 (bytes)."""
+        return armar(stream, seq, tramas, timestamp, flags).tobytes()
+
+    def crc_ok(sobres):
+        """Array bool: el CRC de cada sobre coincide con su payload."""
+        return np.fromiter((crc(p) == c for p, c in zip(sobres["payload"], sobres["crc"])),
+                           dtype=bool, count=len(sobres))
+
+    class LectorSobres(_LectorBase):
+        def avanzar(self, nbytes):
+            """Registra nbytes recibidos en espacio() -> (sobres, crc_ok).
+
+            sobres es un array SOBRE_DTYPE con todos los sobres completos de 68 bytes;
+            si no hay copia (lo normal) es una vista válida hasta el próximo espacio().
+            """
+            self.n += nbytes
+            partes = []
+            i = self.ini
+            while self.n - i >= CABECERA_BYTES:
+                largo = self._largo(i)
+                if largo < 0:
+                    i = self._resincronizar(i)
+                    continue
+                total = CABECERA_BYTES + largo + CRC_BYTES
+                if self.n - i < total:
+                    break
+                if largo != FRAME_BYTES:
+                    self.otros_largos += 1
+                    i += total
+                    continue
+                # Todos los sobres de 68 bytes seguidos, de una vez
+                k = (self.n - i) // SOBRE_BYTES
+                s = np.frombuffer(self.buf, dtype=SOBRE_DTYPE, count=k, offset=i)
+                ok = (s["magic"] == MAGIC) & (s["version"] == VERSION) & (s["largo"] == FRAME_BYTES)
+                if not ok.all():
+                    k = int(np.argmin(ok))  # el primero es válido: k >= 1
+                    s = s[:k]
+                partes.append(s)
+                i += k * SOBRE_BYTES
+            self.ini = i
+            if not partes:
+                return _VACIO, np.empty(0, dtype=bool)
+            s = partes[0] if len(partes) == 1 else np.concatenate(partes)
+            ok = crc_ok(s)
+            malos = int(len(ok) - ok.sum())
+            if malos:
+                self.crc_malos += malos
+                if self.descartar_crc:
+                    s, ok = s[ok], ok[ok]
+            return s, ok
+
+else:
+    def ensobrar(stream, seq, tramas, timestamp=None, flags=0):
+        """k tramas de 68 bytes seguidas -> k sobres v2 (bytes)."""
+        if timestamp is None:
+            timestamp = timestamp_us()
+        out = bytearray()
+        for i in range(0, len(tramas), FRAME_BYTES):
+            out += empaquetar(stream, seq, timestamp, flags, tramas[i:i + FRAME_BYTES])
+            seq += 1
+        return bytes(out)
+
+    class LectorSobres(_LectorBase):
+        def avanzar(self, nbytes):
+            """Registra nbytes recibidos en espacio() -> (sobres, crc_ok).
+
+            sobres es una lista de (stream, seq, timestamp, flags, payload, crc) y crc_ok
+            una lista de bool.
+            """
+            self.n += nbytes
+            sobres, oks = [], []
+            i = self.ini
+            while self.n - i >= CABECERA_BYTES:
+                largo = self._largo(i)
+                if largo < 0:
+                    i = self._resincronizar(i)
+                    continue
+                total = CABECERA_BYTES + largo + CRC_BYTES
+                if self.n - i < total:
+                    break
+                if largo != FRAME_BYTES:
+                    self.otros_largos += 1
+                    i += total
+                    continue
+                _, _, flags, stream, seq, ts, _ = struct.unpack_from(_FMT, self.buf, i)
+                payload = bytes(self.mv[i + CABECERA_BYTES:i + CABECERA_BYTES + largo])
+                crc_valor = struct.unpack_from(">I", self.buf, i + total - CRC_BYTES)[0]
+                ok = crc(payload) == crc_valor
+                i += total
+                if not ok:
+                    self.crc_malos += 1
+                    if self.descartar_crc:
+                        continue
+                sobres.append((stream, seq, ts, flags, payload, crc_valor))
+                oks.append(ok)
+            self.ini = i
+            return sobres, oks
@@ -1,138 +1,320 @@
+import os
+import selectors
 import socket
+import sys
 import time
 
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pam4 import codec
+from pam4 import captura, metricas, registro, sobre
+from pam4.enmarcado import Enmarcador
+from etapas import ColaAcotada, Etapa, Reenvio
+
 # PC <-- ESP32
 HOST = "0.0.0.0"
 PORT = 9100
 
 FRAME_BYTES = 68
+MAX_TRAMAS = 256  # capacidad del buffer de recepción, en frames (ráfagas de cientos por recv)
+SOBRE = True  # sobres v2 con ID de transmisor, seq, timestamp y CRC (pam4/sobre.py); False con --sin-sobre
+INACTIVIDAD = 10  # segundos sin datos de una ESP32 antes de cerrar su conexión
 
 # PC --> VISUALIZADOR
 VIS_IP   = "10.0.1.173"
 VIS_PORT = 8100
 
-def now():
-    return time.strftime("%H:%M:%S")
+# Pipeline (receptor/etapas.py)
+COLA_LOTES = 64          # lotes pendientes entre etapas; si se llena se descarta el más viejo
+MAX_DERRAME = 4 << 20    # bytes guardados mientras el visualizador no está conectado
+
+# Logging (pam4/registro.py)
+NIVEL_LOG = "info"       # "debug" muestra los 272 símbolos de cada frame
+FRAMES_POR_SEGUNDO = 2   # tope de líneas "Frame ..." (y avisos de CRC) por segundo
+TRAZA = None             # archivo de traza binaria por frame, p. ej. "receptor.traza"
+CAPTURA = None           # grabar los sobres etiquetados (pam4/captura.py), p. ej. "receptor.p4cap"
+METRICAS_PUERTO = 9203   # página de métricas en 127.0.0.1 (pam4/metricas.py); None = sin página
+
+log = registro.obtener("receptor")
+
+tramas_entrada = metricas.contador("receptor_tramas_entrada_total", "Tramas recibidas de las ESP32")
+bytes_entrada = metricas.contador("receptor_bytes_entrada_total", "Bytes recibidos de las ESP32")
+conexiones_esp = metricas.contador("receptor_conexiones_total", "Conexiones de ESP32 aceptadas")
+decodificar_us = metricas.histograma("receptor_decodificar_us", "Tiempo de la etapa de decodificación por lote (µs)")
+crc_malos = metricas.contador("receptor_crc_malos_total", "Tramas con CRC inválido")
+perdidas = metricas.contador("receptor_perdidas_total", "Tramas perdidas (huecos de seq)")
+latencia_us = metricas.histograma("receptor_latencia_us", "Desde el timestamp del sobre hasta la decodificación (µs)")
 
 def decodificar_pam4(data_bytes):  #se decodifica en PAM4 los bloques fijos de datos 
-    simbolos = []
-    for b in data_bytes:
-        simbolos.append((b >> 6) & 0b11)
-        simbolos.append((b >> 4) & 0b11)
-        simbolos.append((b >> 2) & 0b11)
-        simbolos.append(b & 0b11)
-    return simbolos
-
-class VisualizadorConn:
-    def __init__(self, host, port):
-        self.host = host
-        self.port = port
-        self.sock = None
+    return codec.bytes_a_simbolos(data_bytes)
+
+class Etiquetas:
+    """(ESP32, stream) -> stream de salida único, para mezclar todo en una sola conexión al
+    visualizador. Una ESP32 que se reconecta desde la misma IP recupera los suyos, si no los
+    tiene otra conexión abierta."""
+
+    def __init__(self):
+        self.por_origen = {}  # (ip, stream) -> etiquetas que ya usó
+        self.duenio = {}      # etiqueta -> ConexionESP que la tiene, None si está libre
+        self.proxima = 1
+
+    def de(self, c, stream: int) -> int:
+        tag = c.tags.get(stream)
+        if tag is not None:
+            return tag
+        usadas = self.por_origen.setdefault((c.ip, stream), [])
+        libres = [t for t in usadas if self.duenio.get(t) is None]
+        if libres:
+            tag = libres[0]
+        else:
+            tag = self.proxima
+            self.proxima = self.proxima % 0xFFFF + 1  # u16, sin el 0
+            usadas.append(tag)
+        self.duenio[tag] = c
+        c.tags[stream] = tag
+        log.info("🏷 ESP32 %s TX%d -> TX%d hacia el visualizador", c.nombre, stream, tag)
+        return tag
+
+    def liberar(self, c):
+        for tag in c.tags.values():
+            self.duenio[tag] = None
+
+class ConexionESP:
+    """Una ESP32 conectada: su propio lector (estado de reensamblado) y sus etiquetas."""
+
+    def __init__(self, conn, addr, etiquetas: Etiquetas):
+        self.conn = conn
+        self.ip = addr[0]
+        self.nombre = f"{addr[0]}:{addr[1]}"
+        self.etiquetas = etiquetas
+        self.tags = {}  # stream de esta ESP32 -> etiqueta hacia el visualizador
+        # Reensambla sobres v2 (o frames crudos de 68 bytes) del stream TCP: se recibe
+        # directo en el buffer del lector y se compacta una vez por lote, no por frame
+        self.lector = sobre.LectorSobres(MAX_TRAMAS) if SOBRE else Enmarcador(FRAME_BYTES, MAX_TRAMAS)
+        self.seq = 0  # sin sobre: seq de los sobres que arma la PC
+        self.frames = 0
+        self.ultimo = time.monotonic()
+
+    def recibir(self):
+        """Un recv_into -> (sobres, oks, nombre) listo para la cola, None si no hay lote
+        completo; lanza EOFError si la ESP32 cerró la conexión."""
+        n = self.conn.recv_into(self.lector.espacio())
+        if not n:
+            raise EOFError
+        bytes_entrada.sumar(n)
+        self.ultimo = time.monotonic()
+        # La vista del lector se pisa en el próximo recv: a la cola va una copia
+        if SOBRE:
+            sobres, oks = self.lector.avanzar(n)
+            if not len(sobres):
+                return None
+            sobres = sobres.copy()
+            streams = sobres["stream"]
+            u = np.unique(streams)
+            if u.size == 1:
+                streams[:] = self.etiquetas.de(self, int(u[0]))
+            else:
+                sobres["stream"] = [self.etiquetas.de(self, int(x)) for x in streams]
+            # el CRC cubre solo el payload: cambiar el stream no lo invalida
+        else:
+            lote = self.lector.avanzar(n)
+            if not lote:
+                return None
+            sobres = sobre.armar(self.etiquetas.de(self, 0), self.seq, lote)
+            oks = np.ones(len(sobres), dtype=bool)
+            self.seq = (self.seq + len(sobres)) % sobre.SEQ_MOD
+        self.frames += len(sobres)
+        tramas_entrada.sumar(len(sobres))
+        return sobres, oks, self.nombre
 
     def close(self):
         try:
-            if self.sock:
-                self.sock.close()
-        except:
+            self.conn.close()
+        except OSError:
             pass
-        self.sock = None
-
-    def _connect(self):
-        self.close()
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(5)
-        s.connect((self.host, self.port))
-        s.settimeout(None)
-        self.sock = s
-        print(f"[{now()}] ✅ conectado al visualizador {self.host}:{self.port}")
-
-    def ensure(self):
-        if self.sock is not None:
-            return
-        backoff = [1, 2, 4, 8, 10]
-        for t in backoff:
-            try:
-                self._connect()
-                return
-            except Exception as e:
-                print(f"[{now()}] ⚠ no se pudo conectar al visualizador: {e} (reintento en {t}s)")
-                time.sleep(t)
-        while True:
-            try:
-                self._connect()
-                return
-            except Exception as e:
-                print(f"[{now()}] ⚠ reintento visualizador en 10s: {e}")
-                time.sleep(10)
-
-    def send_bytes(self, data: bytes):
-        if not data:
-            return
-        try:
-            self.ensure()
-            self.sock.sendall(data)
-            print(f"[{now()}] ▶ reenviado al visualizador ({len(data)}B)")
-        except Exception as e:
-            print(f"[{now()}] ⚠ error enviando al visualizador: {e}")
-            self.close()
 
-def process_frame(frame_bytes: bytes, frame_idx: int, vis: VisualizadorConn):
-    if len(frame_bytes) != FRAME_BYTES:
-        print(f"[{now()}] ⚠ frame {frame_idx} con tamaño inesperado: {len(frame_bytes)}B")
-        return
+class Decodificador:
+    """Etapa de decodificación: revisa y muestra cada lote y lo pasa al reenvío.
 
-    header = frame_bytes[:4]   #toma los primeros 4 bytes del bloque fijo (asumimos que es el hola) 
-    try:
-        header_txt = header.decode("latin1")
-    except Exception:
-        header_txt = repr(list(header))
+    El detalle por frame sale por el log: la línea de cada frame con un tope por segundo
+    (Limitador) y los 272 símbolos solo en debug, así la consola no frena la etapa.
+    """
 
-    print(f"[{now()}] Frame {frame_idx}: cabecera = {header_txt!r}")   #Los muestra por pantalla como cabecera:
+    def __init__(self, salida: ColaAcotada, traza=None, grabador=None):
+        self.salida = salida
+        self.traza = traza
+        self.grabador = grabador
+        self.frame_idx = 0
+        self.seq_esperado = {}  # stream -> próximo seq, para detectar frames perdidos
+        self.frames_log = registro.Limitador(log, FRAMES_POR_SEGUNDO)
+        self.crc_log = registro.Limitador(log, FRAMES_POR_SEGUNDO, registro.WARNING)
 
-    simbolos = decodificar_pam4(frame_bytes)
-    print(f"[{now()}] 🧠 Símbolos PAM4 decodificados ({len(simbolos)}):")
-    print("   ", simbolos)
-    print()
+    def revisar(self, sobres, oks):
+        """Huecos de seq de cada stream y CRC inválidos, para todo el lote de una vez."""
+        streams = sobres["stream"]
+        for st in np.unique(streams):
+            st = int(st)
+            seqs = sobres["seq"][streams == st].astype(np.int64)
+            esperado = np.empty_like(seqs)
+            esperado[0] = self.seq_esperado.get(st, seqs[0])
+            esperado[1:] = seqs[:-1] + 1
+            huecos = (seqs - esperado) % sobre.SEQ_MOD
+            perdidas.sumar(int(huecos.sum()))
+            for j in np.flatnonzero(huecos):  # solo los frames después de un hueco
+                log.warning("⚠ TX%d: faltan %d frames antes del seq %d", st, huecos[j], seqs[j])
+                if self.traza:
+                    self.traza.registrar(registro.EV_PERDIDA, st, int(seqs[j]), int(huecos[j]))
+            self.seq_esperado[st] = int(seqs[-1] + 1) % sobre.SEQ_MOD
+        malos = np.flatnonzero(~oks)
+        crc_malos.sumar(len(malos))
+        for j in malos:
+            if self.crc_log.permitir():
+                self.crc_log.log("⚠ frame %d: CRC inválido (símbolos alterados en el canal)",
+                                 self.frame_idx + j + 1)
+            if self.traza:
+                self.traza.registrar(registro.EV_CRC_MALO, int(streams[j]), int(sobres["seq"][j]))
 
-    vis.send_bytes(frame_bytes)
+    def process_lote(self, lote):
+        """Todas las tramas completas de un recv: vista NumPy (n, 68), sin copiar frame por frame.
+
+        lote = (sobres, oks, esp) con los sobres ya etiquetados por ConexionESP.
+        """
+        with decodificar_us.medir():
+            self._process_lote(*lote)
+
+    def _process_lote(self, sobres, oks, esp):
+        latencia_us.registrar_lote(sobre.timestamp_us() - sobres["timestamp"].astype(np.int64))
+        tramas = sobres["payload"]
+        simbolos = decodificar_pam4(tramas).reshape(len(tramas), -1)  # (n, 272) de una vez
+        self.revisar(sobres, oks)
+        if self.traza:
+            ahora = sobre.timestamp_us()
+            for j in range(len(sobres)):
+                self.traza.registrar(registro.EV_TRAMA_RX, int(sobres["stream"][j]),
+                                     int(sobres["seq"][j]), int(oks[j]), ahora)
+        if self.grabador:
+            self.grabador.grabar(sobres)
+
+        depurar = log.isEnabledFor(registro.DEBUG)
+        for j in range(len(tramas)):
+            self.frame_idx += 1
+            if self.frames_log.permitir():
+                header = tramas[j, :4].tobytes()   #toma los primeros 4 bytes del bloque fijo (asumimos que es el hola) 
+                try:
+                    header_txt = header.decode("latin1")
+                except Exception:
+                    header_txt = repr(list(header))
+                latencia = (sobre.timestamp_us() - int(sobres["timestamp"][j])) / 1000
+                self.frames_log.log("Frame %d [%s] TX%d seq %d CRC %s latencia %.1f ms: cabecera = %r",
+                                    self.frame_idx, esp, sobres["stream"][j], sobres["seq"][j],
+                                    "✓" if oks[j] else "✗", latencia, header_txt)
+            if depurar:
+                log.debug("🧠 Símbolos PAM4 decodificados (%d): %s", simbolos.shape[1], simbolos[j].tolist())
+
+        # Todo el lote en un solo envío; con el sobre etiquetado, así el visualizador separa
+        # los transmisores de todas las ESP32 aunque lleguen mezclados
+        self.salida.poner(sobres.tobytes())
+
+def registrar_medidores(colas, reenvio: Reenvio, conexiones):
+    """Estadísticas que las etapas ya llevan, leídas recién al publicar las métricas."""
+    metricas.medidor("receptor_esp32_conectadas", lambda: len(conexiones), "ESP32 conectadas")
+    metricas.medidor("receptor_cola", lambda: {n: len(c) for n, c in colas.items()},
+                     "Lotes esperando en cada cola del pipeline", etiqueta="cola")
+    metricas.medidor("receptor_cola_max", lambda: {n: c.max_lag for n, c in colas.items()},
+                     "Máximo de lotes que llegó a tener cada cola", etiqueta="cola")
+    metricas.medidor("receptor_cola_descartados_total", lambda: {n: c.descartados for n, c in colas.items()},
+                     "Lotes descartados por cola llena", etiqueta="cola", tipo="counter")
+    metricas.medidor("receptor_bytes_salida_total", lambda: reenvio.enviados,
+                     "Bytes reenviados al visualizador", tipo="counter")
+    metricas.medidor("receptor_derrame_bytes", lambda: reenvio.derrame_bytes,
+                     "Bytes guardados esperando al visualizador")
+    metricas.medidor("receptor_derrame_descartados_bytes_total", lambda: reenvio.descartados,
+                     "Bytes tirados del derrame por falta de lugar", tipo="counter")
+    metricas.medidor("receptor_reconexiones_total", lambda: max(0, reenvio.conexiones - 1),
+                     "Reconexiones con el visualizador", tipo="counter")
+
+def resumen(cola_decod: ColaAcotada, cola_reenvio: ColaAcotada, reenvio: Reenvio) -> str:
+    e = reenvio.estadisticas()
+    return (f"cola decodificación: {len(cola_decod)} (máx {cola_decod.max_lag}, {cola_decod.descartados} lotes descartados) | "
+            f"cola reenvío: {len(cola_reenvio)} (máx {cola_reenvio.max_lag}, {cola_reenvio.descartados} descartados) | "
+            f"visualizador {'conectado' if e['conectado'] else 'desconectado'}: {e['enviados_bytes']}B enviados, "
+            f"derrame {e['derrame_bytes']}B (máx {e['derrame_max_bytes']}B), {e['descartados_bytes']}B descartados")
 
 def main():
-    frame_idx = 0
-    vis = VisualizadorConn(VIS_IP, VIS_PORT)
+    # Pipeline: recepción de todas las ESP32 (este hilo, con selectors) -> decodificación
+    # -> reenvío, con colas acotadas
+    registro.configurar(NIVEL_LOG)
+    traza = registro.TrazaBinaria(TRAZA) if TRAZA else None
+    grabador = captura.Grabador(CAPTURA, "receptor") if CAPTURA else None
+    cola_decod = ColaAcotada(COLA_LOTES)
+    cola_reenvio = ColaAcotada(COLA_LOTES)
+    Etapa("decodificación", cola_decod, Decodificador(cola_reenvio, traza, grabador).process_lote)
+    reenvio = Reenvio(VIS_IP, VIS_PORT, cola_reenvio, MAX_DERRAME)
+
+    etiquetas = Etiquetas()
+    conexiones = {}  # socket -> ConexionESP
+    registrar_medidores({"decodificacion": cola_decod, "reenvio": cola_reenvio}, reenvio, conexiones)
+    if METRICAS_PUERTO:
+        metricas.servir(METRICAS_PUERTO)
+    sel = selectors.DefaultSelector()
+
+    def cerrar(c, motivo):
+        sel.unregister(c.conn)
+        del conexiones[c.conn]
+        c.close()
+        etiquetas.liberar(c)
+        log.warning("⚠ ESP32 %s: %s (%d frames, quedan %d conectadas)", c.nombre, motivo, c.frames, len(conexiones))
+        log.info("📊 %s", resumen(cola_decod, cola_reenvio, reenvio))
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         s.bind((HOST, PORT))
-        s.listen(1)
-        print(f"[{now()}] PC escuchando a ESP32 en {HOST}:{PORT}")
-
-        while True:
-            print(f"[{now()}] ⏳ Esperando conexión de ESP32...")
-            conn, addr = s.accept()
-            print(f"[{now()}] 🔗 Conectado desde {addr}")
+        s.listen(16)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ)
+        log.info("PC escuchando ESP32 en %s:%s (varias a la vez)", HOST, PORT)
 
-            bin_buf = bytearray()
-
-            with conn:
-                conn.settimeout(10)
-                while True:
+        try:
+            while True:
+                for key, _ in sel.select(timeout=1.0):
+                    if key.fileobj is s:
+                        conn, addr = s.accept()
+                        conn.setblocking(False)
+                        c = conexiones[conn] = ConexionESP(conn, addr, etiquetas)
+                        conexiones_esp.sumar()
+                        sel.register(conn, selectors.EVENT_READ, c)
+                        log.info("🔗 Conectado desde %s (%d ESP32 conectadas)", addr, len(conexiones))
+                        continue
+                    c = key.data
+                    if c.conn not in conexiones:  # cerrada antes en esta misma vuelta
+                        continue
                     try:
-                        data = conn.recv(4096)
-                    except socket.timeout:
-                        print(f"[{now()}] ⏱ Timeout de recepción, cierro conexión y espero otra")
-                        break
-
-                    if not data:
-                        print(f"[{now()}] ⚠ Conexión cerrada por la ESP32")
-                        break
-
-                    bin_buf.extend(data)
-
-                    while len(bin_buf) >= FRAME_BYTES:
-                        frame = bytes(bin_buf[:FRAME_BYTES])
-                        del bin_buf[:FRAME_BYTES]
-                        frame_idx += 1
-                        process_frame(frame, frame_idx, vis)
+                        lote = c.recibir()
+                    except BlockingIOError:
+                        continue
+                    except EOFError:
+                        cerrar(c, "conexión cerrada por la ESP32")
+                        continue
+                    except OSError as e:
+                        cerrar(c, f"error de recepción: {e}")
+                        continue
+                    if lote:
+                        cola_decod.poner(lote)  # nunca bloquea
+
+                # Sin datos por INACTIVIDAD segundos: se cierra esa conexión (las demás siguen)
+                ahora = time.monotonic()
+                for c in list(conexiones.values()):
+                    if ahora - c.ultimo > INACTIVIDAD:
+                        cerrar(c, "timeout de recepción")
+        except KeyboardInterrupt:
+            log.info("Receptor detenido.")
+        finally:
+            if traza:
+                traza.cerrar()
+            if grabador:
+                grabador.cerrar()
+            registro.cerrar()
 
 if __name__ == "__main__":
     main()
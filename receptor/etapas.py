@@ -0,0 +1,171 @@
+# etapas.py - Pipeline del receptor PC: recepción -> decodificación -> reenvío
+#
+# Cada etapa corre en su propio hilo y se comunica con la siguiente por una
+# ColaAcotada. poner() nunca bloquea: si la cola está llena se descarta el lote más
+# viejo (y se cuenta), así la recepción desde la ESP32 nunca espera a la consola
+# ni al visualizador.
+#
+# El reenvío (Reenvio) no espera la reconexión: mientras el visualizador no está,
+# los lotes se guardan en un buffer de derrame de `max_derrame` bytes (se tiran los
+# más viejos si no entran) y un hilo aparte reintenta con backoff. Al reconectar se
+# manda todo lo guardado, en orden. Un visualizador que deja de leer cuenta como
+# desconectado: si un envío tarda más de ENVIO_TIMEOUT s se cierra la conexión, los
+# lotes siguen en el derrame y se reconecta.
+
+import socket
+import threading
+import time
+from collections import deque
+
+from pam4 import registro  # el script principal agrega la raíz del repo al sys.path
+
+BACKOFF = [1, 2, 4, 8, 10]
+ENVIO_TIMEOUT = 5  # s
+
+log = registro.obtener("receptor.etapas")
+
+
+class ColaAcotada:
+    def __init__(self, max_lotes=64):
+        self.cola = deque(maxlen=max(1, int(max_lotes)))
+        self.cond = threading.Condition()
+        self.descartados = 0
+        self.max_lag = 0
+
+    def __len__(self):
+        return len(self.cola)
+
+    def poner(self, lote):
+        with self.cond:
+            if len(self.cola) == self.cola.maxlen:
+                self.descartados += 1  # deque(maxlen) descarta el más viejo
+            self.cola.append(lote)
+            self.max_lag = max(self.max_lag, len(self.cola))
+            self.cond.notify()
+
+    def sacar_todo(self, timeout=None):
+        """Todos los lotes pendientes (espera hasta timeout si no hay ninguno)."""
+        with self.cond:
+            if not self.cola:
+                self.cond.wait(timeout)
+            lotes = list(self.cola)
+            self.cola.clear()
+        return lotes
+
+
+class Etapa:
+    """Hilo que aplica `funcion` a cada lote de `entrada`, en orden."""
+
+    def __init__(self, nombre, entrada, funcion):
+        self.nombre = nombre
+        self.entrada = entrada
+        self.funcion = funcion
+        self.procesados = 0
+        self.hilo = threading.Thread(target=self._run, name=nombre, daemon=True)
+        self.hilo.start()
+
+    def _run(self):
+        while True:
+            for lote in self.entrada.sacar_todo():
+                try:
+                    self.funcion(lote)
+                except Exception as e:
+                    log.error("⚠ error en la etapa de %s: %s", self.nombre, e)
+                self.procesados += 1
+
+
+class Reenvio:
+    """Etapa de reenvío al visualizador: conexión persistente con reconexión en segundo plano."""
+
+    def __init__(self, host, port, entrada, max_derrame=1 << 20):
+        self.host = host
+        self.port = port
+        self.entrada = entrada
+        self.max_derrame = max_derrame
+        self.derrame = deque()  # lotes (bytes) que esperan conexión
+        self.derrame_bytes = 0
+        self.sock = None
+        self.conectando = threading.Lock()
+
+        # Estadísticas
+        self.enviados = 0      # bytes
+        self.descartados = 0   # bytes tirados del derrame por falta de lugar
+        self.max_derrame_usado = 0
+        self.conexiones = 0
+
+        self.hilo = threading.Thread(target=self._run, name="reenvío", daemon=True)
+        self.hilo.start()
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+    def close(self):
+        try:
+            if self.sock:
+                self.sock.close()
+        except OSError:
+            pass
+        self.sock = None
+
+    def _reconectar(self):
+        # Hilo aparte: el reenvío sigue juntando lotes en el derrame mientras tanto
+        intento = 0
+        while self.sock is None:
+            try:
+                s = socket.create_connection((self.host, self.port), timeout=5)
+                s.settimeout(ENVIO_TIMEOUT)
+                self.sock = s
+                self.conexiones += 1
+                log.info("✅ conectado al visualizador %s", self)
+            except OSError as e:
+                espera = BACKOFF[min(intento, len(BACKOFF) - 1)]
+                log.warning("⚠ no se pudo conectar al visualizador: %s (reintento en %ss)", e, espera)
+                intento += 1
+                time.sleep(espera)
+        self.conectando.release()
+        with self.entrada.cond:
+            self.entrada.cond.notify()  # que el reenvío vacíe el derrame ya
+
+    def _guardar(self, datos):
+        self.derrame.append(datos)
+        self.derrame_bytes += len(datos)
+        while self.derrame_bytes > self.max_derrame and len(self.derrame) > 1:
+            viejo = self.derrame.popleft()
+            self.derrame_bytes -= len(viejo)
+            self.descartados += len(viejo)
+        self.max_derrame_usado = max(self.max_derrame_usado, self.derrame_bytes)
+
+    def _run(self):
+        while True:
+            for datos in self.entrada.sacar_todo(timeout=1.0):
+                if datos:
+                    self._guardar(datos)
+            if not self.derrame:
+                continue
+            if self.sock is None:
+                if self.conectando.acquire(False):
+                    threading.Thread(target=self._reconectar, daemon=True).start()
+                continue
+            try:
+                while self.derrame:
+                    datos = self.derrame[0]
+                    self.sock.sendall(datos)
+                    self.derrame.popleft()  # recién ahora: si falla, se reenvía entero al reconectar
+                    self.derrame_bytes -= len(datos)
+                    self.enviados += len(datos)
+                    if log.isEnabledFor(registro.DEBUG):
+                        log.debug("▶ reenviado al visualizador (%dB)", len(datos))
+            except OSError as e:  # incluye el timeout de un visualizador que no lee
+                log.warning("⚠ error enviando al visualizador: %s", e)
+                self.close()
+
+    def estadisticas(self):
+        return {
+            "destino": str(self),
+            "conectado": self.sock is not None,
+            "enviados_bytes": self.enviados,
+            "derrame_bytes": self.derrame_bytes,
+            "derrame_max_bytes": self.max_derrame_usado,
+            "descartados_bytes": self.descartados,
+            "reconexiones": max(0, self.conexiones - 1),
+        }
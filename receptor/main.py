@@ -1,9 +1,15 @@
 # main.py -- ESP32 Receptor
-# Recibe bytes desde el CANAL y reenvía frames de 68 bytes a la PC en streaming.
+# Recibe bytes desde el CANAL y reenvía frames a la PC en streaming.
 #
 # Formato de cada frame:
 #   0..3  -> 'h','o','l','a'   (cabecera)
 #   4..67 -> 64 amplitudes 0..255
+#
+# Cada frame viaja en un sobre v2 (ver pam4/sobre.py): cabecera de 20 bytes con magic
+# "P4", versión 2, ID del transmisor, seq, timestamp y largo del payload, y un CRC-32
+# al final. La ESP no lo verifica: con el largo corta cada sobre completo y lo reenvía
+# entero, así la PC sabe de qué transmisor es y si llegó sano. Si la cabecera no es
+# válida, descarta bytes hasta el próximo magic.
 
 import network
 import usocket as socket
@@ -22,6 +28,16 @@ PC_IP      = "10.0.0.131"   # IPv4 de tu PC receptora
 PC_PORT_TX = 9100           # puerto donde escucha tu script de PC
 
 FRAME_BYTES = 68            # "hola" (4) + 64 amplitudes
+SOBRE = True                # False si el canal corre con --sin-sobre (frames crudos)
+MAGIC = b"P4\x02"           # magic + versión 2
+CABECERA_BYTES = 20
+CRC_BYTES = 4
+MAX_PAYLOAD = 1024          # un largo mayor se toma como cabecera rota
+DEBUG = False               # True: una línea por lote recibido y reenviado (frena la placa)
+BUF_BYTES = 4096            # buffer de recepción preasignado (entra más de un sobre máximo)
+
+buf = bytearray(BUF_BYTES)
+mv = memoryview(buf)
 
 pc_sock = None  # socket persistente hacia la PC
 
@@ -73,7 +89,7 @@ def conectar_pc():
 
 def enviar_frame_a_pc_stream(frame_bytes):
     """
-    Envía un frame de 68 bytes a la PC usando la conexión persistente.
+    Envía uno o más frames (con su sobre) a la PC usando la conexión persistente.
     Si se rompe la conexión, reconecta y reintenta una vez.
     """
     global pc_sock
@@ -84,7 +100,8 @@ def enviar_frame_a_pc_stream(frame_bytes):
     for intento in range(2):
         try:
             pc_sock.sendall(frame_bytes)
-            print("▶ frame (68 bytes) enviado a PC")
+            if DEBUG:
+                print("▶ frame ({} bytes) enviado a PC".format(len(frame_bytes)))
             return
         except Exception as e:
             print("⚠️ error enviando a PC:", e)
@@ -101,6 +118,23 @@ def enviar_frame_a_pc_stream(frame_bytes):
                 return
 
 
+def cortar_bloque(buf, i, n):
+    """Largo del bloque completo que empieza en buf[i] (válidos hasta n), 0 si falta
+    recibir, -k si hay k bytes de basura."""
+    if not SOBRE:
+        return FRAME_BYTES if n - i >= FRAME_BYTES else 0
+    if n - i < CABECERA_BYTES:
+        return 0
+    if buf[i] != MAGIC[0] or buf[i + 1] != MAGIC[1] or buf[i + 2] != MAGIC[2]:
+        j = bytes(buf[i + 1:n]).find(MAGIC)  # solo con basura en el stream
+        return -(j + 1 if j >= 0 else n - i - 2)
+    largo = (buf[i + 18] << 8) | buf[i + 19]
+    if largo > MAX_PAYLOAD:
+        return -1
+    total = CABECERA_BYTES + largo + CRC_BYTES
+    return total if n - i >= total else 0
+
+
 def main():
     wifi_connect()
     conectar_pc()  # conexión persistente con la PC
@@ -111,8 +145,8 @@ def main():
         srv.bind((IP_RX, PORT_RX))
         srv.listen(1)
         print("📡 ESP32 escuchando al CANAL en {}:{}".format(IP_RX, PORT_RX))
-        print("↩️  Reenviará frames de 68 bytes a {}:{} (conexión persistente)".format(
-            PC_IP, PC_PORT_TX
+        print("↩️  Reenviará {} a {}:{} (conexión persistente)".format(
+            "sobres v2" if SOBRE else "frames de {} bytes".format(FRAME_BYTES), PC_IP, PC_PORT_TX
         ))
 
         while True:
@@ -120,26 +154,45 @@ def main():
             conn, addr = srv.accept()
             print("🔗 Conexión desde {}".format(addr))
 
-            buf = bytearray()
+            n = 0  # bytes válidos en buf
 
             try:
                 # SIN timeout: la conexión con el canal se mantiene
                 while True:
-                    chunk = conn.recv(1024)
-                    if not chunk:
+                    # una sola lectura con lo que haya llegado, copiada al buffer preasignado:
+                    # readinto bloqueante esperaría a llenar los 4 KB (~44 sobres) antes de reenviar
+                    data = conn.recv(BUF_BYTES - n)
+                    k = len(data)
+                    if not k:
                         print("⚠️ Conexión del canal cerrada por el otro lado")
                         break
-
-                    # acumular bytes crudos del canal
-                    buf.extend(chunk)
-
-                    # mientras haya al menos 68 bytes, armar frames completos
-                    while len(buf) >= FRAME_BYTES:
-                        frame = bytes(buf[:FRAME_BYTES])
-                        buf = buf[FRAME_BYTES:]   # mover ventana en el buffer
-
-                        print("🧱 frame crudo(68B):", list(frame))
-                        enviar_frame_a_pc_stream(frame)
+                    mv[n:n + k] = data
+                    n += k
+
+                    # cortar todos los bloques completos; se reenvían juntos, sin copiarlos
+                    i = ini = 0
+                    while True:
+                        k = cortar_bloque(buf, i, n)
+                        if k == 0:
+                            break
+                        if k < 0:
+                            if i > ini:
+                                enviar_frame_a_pc_stream(mv[ini:i])
+                            print("⚠️ {} bytes sin sobre válido, se descartan".format(-k))
+                            i = ini = i - k
+                            continue
+                        i += k
+                    if i > ini:
+                        if DEBUG:
+                            print("🧱 frames crudos ({}B)".format(i - ini))
+                        enviar_frame_a_pc_stream(mv[ini:i])
+
+                    # compactar una sola vez por lote: el resto (< 1 bloque) al principio
+                    if i:
+                        resto = n - i
+                        if resto:
+                            mv[:resto] = mv[i:n]
+                        n = resto
 
             except Exception as e:
                 print("⚠️ error RX desde el canal:", e)